@@ -0,0 +1,233 @@
+"""JSON API для мобильного клиента, только чтение.
+
+Строки читаются через .values(), без создания моделей, и списки
+отдаются потоком по мере чтения из базы. Анонимные ответы несут ETag
+из поколений кэша (см. cache_keys) и разрешают общее кэширование.
+"""
+import json
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.views.decorators.http import require_safe
+
+from posts.models import Comment, Group, Post, User
+from posts.page_cache import (group_scope, index_scope, profile_scope,
+                              scope_etag)
+from posts.paginators import CursorPaginator, decode_cursor, encode_cursor
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+POST_FIELDS = (
+    "id", "text", "pub_date", "comment_count",
+    "author__username", "author__first_name", "author__last_name",
+    "group_id", "group__slug", "group__title",
+    "image", "thumbnail", "thumbnail_width", "thumbnail_height",
+)
+COMMENT_FIELDS = ("id", "text", "created", "author__username",
+                  "author__first_name", "author__last_name")
+GROUP_FIELDS = ("slug", "title", "description")
+
+
+def _limit(request):
+    try:
+        limit = int(request.GET.get("limit", DEFAULT_LIMIT))
+    except ValueError:
+        limit = DEFAULT_LIMIT
+    return min(max(limit, 1), MAX_LIMIT)
+
+
+def _dumps(value):
+    return json.dumps(value, ensure_ascii=False)
+
+
+def serialize_author(row):
+    if row["author__username"] is None:
+        return None
+    return {
+        "username": row["author__username"],
+        "name": f"{row['author__first_name']} "
+                f"{row['author__last_name']}".strip(),
+    }
+
+
+def serialize_post(row):
+    image = None
+    if row["thumbnail"]:
+        image = {"url": default_storage.url(row["thumbnail"]),
+                 "width": row["thumbnail_width"],
+                 "height": row["thumbnail_height"]}
+    elif row["image"]:
+        image = {"url": default_storage.url(row["image"]),
+                 "width": None, "height": None}
+    return {
+        "id": row["id"],
+        "text": row["text"],
+        "pub_date": row["pub_date"].isoformat(),
+        "author": serialize_author(row),
+        "group": {"slug": row["group__slug"], "title": row["group__title"]}
+        if row["group_id"] is not None else None,
+        "comment_count": row["comment_count"],
+        "image": image,
+    }
+
+
+def serialize_comment(row):
+    return {
+        "id": row["id"],
+        "text": row["text"],
+        "created": row["created"].isoformat(),
+        "author": serialize_author(row),
+    }
+
+
+def stream_page(rows, limit, serialize, date_field):
+    """Пишет {"results": [...], "next": курсор} по мере чтения строк.
+
+    rows должен отдавать до limit + 1 строк: лишняя строка означает,
+    что есть следующая страница.
+    """
+    yield '{"results": ['
+    previous = next_cursor = None
+    for number, row in enumerate(rows):
+        if number == limit:
+            next_cursor = encode_cursor(previous[date_field], previous["id"])
+            break
+        if number:
+            yield ", "
+        yield _dumps(serialize(row))
+        previous = row
+    yield f'], "next": {_dumps(next_cursor)}}}'
+
+
+def _not_found():
+    return JsonResponse({"detail": "Не найдено"}, status=404)
+
+
+def cached_response(request, scopes, make_response):
+    """Для анонимов: ETag по поколениям scopes, 304 без обращения к
+    данным и разрешение кэшировать ответ на API_CACHE_MAX_AGE секунд."""
+    if request.user.is_authenticated:
+        response = make_response()
+        patch_cache_control(response, private=True, max_age=0)
+        return response
+    etag = scope_etag(request, *scopes)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = make_response()
+    if response.status_code in (200, 304):
+        response["ETag"] = etag
+        patch_cache_control(response, public=True,
+                            max_age=settings.API_CACHE_MAX_AGE)
+    return response
+
+
+def _post_list(request, scope, queryset):
+    limit = _limit(request)
+    cursor = decode_cursor(request.GET.get("after"))
+    paginator = CursorPaginator(queryset, limit)
+    rows = paginator.queryset_after(cursor).values(*POST_FIELDS)[:limit + 1]
+
+    def make_response():
+        return StreamingHttpResponse(
+            stream_page(rows.iterator(), limit, serialize_post, "pub_date"),
+            content_type="application/json")
+
+    return cached_response(request, scope.generations, make_response)
+
+
+@require_safe
+def posts(request):
+    return _post_list(request, index_scope(), Post.objects.all())
+
+
+@require_safe
+def group_posts(request, slug):
+    scope = group_scope(slug)
+    if scope is None:
+        return _not_found()
+    return _post_list(request, scope, scope.posts)
+
+
+@require_safe
+def user_posts(request, username):
+    scope = profile_scope(username)
+    if scope is None:
+        return _not_found()
+    return _post_list(request, scope, scope.posts)
+
+
+@require_safe
+def user_detail(request, username):
+    scope = profile_scope(username)
+    if scope is None:
+        return _not_found()
+
+    def make_response():
+        row = User.objects.filter(username=username).values(
+            "username", "first_name", "last_name", "stats__posts_count",
+            "stats__followers_count", "stats__following_count").first()
+        return JsonResponse({
+            "username": row["username"],
+            "name": f"{row['first_name']} {row['last_name']}".strip(),
+            "posts_count": row["stats__posts_count"] or 0,
+            "followers_count": row["stats__followers_count"] or 0,
+            "following_count": row["stats__following_count"] or 0,
+        }, json_dumps_params={"ensure_ascii": False})
+
+    return cached_response(request, scope.generations, make_response)
+
+
+@require_safe
+def post_detail(request, post_id):
+    def make_response():
+        row = Post.objects.filter(pk=post_id).values(*POST_FIELDS).first()
+        if row is None:
+            return _not_found()
+        return JsonResponse(serialize_post(row),
+                            json_dumps_params={"ensure_ascii": False})
+
+    return cached_response(request, (("post", post_id),), make_response)
+
+
+@require_safe
+def post_comments(request, post_id):
+    limit = _limit(request)
+    cursor = decode_cursor(request.GET.get("after"))
+    paginator = CursorPaginator(Comment.objects.filter(post_id=post_id),
+                                limit, ordering=("created", "pk"))
+    rows = paginator.queryset_after(cursor).values(
+        *COMMENT_FIELDS)[:limit + 1]
+
+    def make_response():
+        # Пустой список не отличить от поста, которого нет.
+        if not Post.objects.filter(pk=post_id).exists():
+            return _not_found()
+        return StreamingHttpResponse(
+            stream_page(rows.iterator(), limit, serialize_comment,
+                        "created"),
+            content_type="application/json")
+
+    return cached_response(request, (("post", post_id),), make_response)
+
+
+@require_safe
+def groups(request):
+    rows = Group.objects.order_by("title").values(*GROUP_FIELDS)
+
+    def stream():
+        yield '{"results": ['
+        for number, row in enumerate(rows.iterator()):
+            if number:
+                yield ", "
+            yield _dumps(row)
+        yield "]}"
+
+    response = StreamingHttpResponse(stream(),
+                                     content_type="application/json")
+    if not request.user.is_authenticated:
+        patch_cache_control(response, public=True,
+                            max_age=settings.API_CACHE_MAX_AGE)
+    return response
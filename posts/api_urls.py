@@ -0,0 +1,16 @@
+from django.urls import path
+
+from posts import api
+
+app_name = "api"
+
+urlpatterns = [
+    path("posts/", api.posts, name="posts"),
+    path("posts/<int:post_id>/", api.post_detail, name="post"),
+    path("posts/<int:post_id>/comments/", api.post_comments,
+         name="post_comments"),
+    path("groups/", api.groups, name="groups"),
+    path("groups/<slug:slug>/posts/", api.group_posts, name="group_posts"),
+    path("users/<str:username>/", api.user_detail, name="user"),
+    path("users/<str:username>/posts/", api.user_posts, name="user_posts"),
+]
@@ -3,3 +3,10 @@ from django.apps import AppConfig
 
 class PostsConfig(AppConfig):
     name = 'posts'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        import posts.signals  # noqa
+        from posts.writes import configure_sqlite
+        connection_created.connect(configure_sqlite)
@@ -0,0 +1,96 @@
+"""request.user без обращения к базе.
+
+Сессии хранит cached_db (SESSION_ENGINE): чтение из общего кэша, запись
+сквозная — в кэш и в таблицу сессий. Пользователя по id из сессии
+CachedModelBackend берёт так:
+
+1. поколение ("user", id) — одно обращение к общему кэшу;
+2. объект из LRU процесса по (id, поколение);
+3. при промахе — из общего кэша, и только затем из базы.
+
+Сохранение или удаление пользователя сдвигает поколение, поэтому старые
+копии во всех процессах перестают находиться и вытесняются из LRU.
+"""
+import copy
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.core.exceptions import PermissionDenied
+
+from posts import cache_keys
+from posts.models import User
+from posts.routing import primary_reads
+
+
+class UserLRU:
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            user = self.entries.get(key)
+            if user is not None:
+                self.entries.move_to_end(key)
+            return user
+
+    def put(self, key, user):
+        with self.lock:
+            self.entries[key] = user
+            self.entries.move_to_end(key)
+            while len(self.entries) > settings.USER_CACHE_SIZE:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+_users = UserLRU()
+
+
+def cached_user(user_id):
+    """Пользователь по id или None, если его нет."""
+    version, = cache_keys.generations(("user", user_id))
+    key = (user_id, version)
+    user = _users.get(key)
+    if user is None:
+        shared_key = f"user:{user_id}:{version}"
+        user = cache.get(shared_key)
+        if user is None:
+            # Кэш живёт до следующего сохранения: отстающая реплика
+            # закрепила бы в нём старые данные.
+            with primary_reads():
+                user = User.objects.filter(pk=user_id).first()
+            if user is None:
+                return None
+            # В копии есть хэш пароля: после сдвига поколения она не
+            # должна жить в общем кэше бессрочно.
+            cache.set(shared_key, user, settings.USER_CACHE_TIMEOUT)
+        _users.put(key, user)
+    # Каждому запросу своя копия: объект из LRU общий для потоков.
+    return copy.deepcopy(user)
+
+
+def invalidate(user_id):
+    """Сдвигает поколение пользователя сразу и ещё раз после коммита:
+    копия, прочитанная до коммита, не переживёт второго сдвига."""
+    cache_keys.bump_now(("user", user_id))
+    cache_keys.bump(("user", user_id))
+
+
+class CachedModelBackend(ModelBackend):
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        user = super().authenticate(request, username, password, **kwargs)
+        if user is None and password is not None:
+            # Проверка та же, что у ModelBackend после нас в списке:
+            # не даём ему хэшировать пароль второй раз.
+            raise PermissionDenied
+        return user
+
+    def get_user(self, user_id):
+        user = cached_user(user_id)
+        return user if self.user_can_authenticate(user) else None
@@ -0,0 +1,59 @@
+import time
+from collections import namedtuple
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+# name — имя URL, method — метод запроса, make_request(dataset) отдаёт
+# (клиент, адрес, данные формы) для очередного запроса.
+Scenario = namedtuple("Scenario", ("name", "method", "make_request"))
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = min(int(len(ordered) * fraction), len(ordered) - 1)
+    return ordered[index]
+
+
+def measure(client, method, url, data=None):
+    """Выполняет запрос и возвращает (секунды, SQL-запросы, байты, код)."""
+    with CaptureQueriesContext(connection) as queries:
+        started = time.perf_counter()
+        response = getattr(client, method)(url, data or {})
+        # Потоковый ответ читает базу, пока отдаётся тело.
+        size = len(response.content) if not response.streaming else sum(
+            len(chunk) for chunk in response.streaming_content)
+        elapsed = time.perf_counter() - started
+    return elapsed, len(queries), size, response.status_code
+
+
+def summarize(samples):
+    timings = [sample[0] for sample in samples]
+    queries = [sample[1] for sample in samples]
+    sizes = [sample[2] for sample in samples]
+    statuses = sorted({sample[3] for sample in samples})
+    return {
+        "requests": len(samples),
+        "p50_ms": percentile(timings, 0.50) * 1000,
+        "p95_ms": percentile(timings, 0.95) * 1000,
+        "p99_ms": percentile(timings, 0.99) * 1000,
+        "mean_ms": sum(timings) / len(timings) * 1000,
+        "queries_mean": sum(queries) / len(queries),
+        "queries_max": max(queries),
+        "bytes_mean": sum(sizes) / len(sizes),
+        "statuses": statuses,
+    }
+
+
+def run(scenarios, dataset, requests, warmup=1):
+    results = {}
+    for scenario in scenarios:
+        for _ in range(warmup):
+            client, url, data = scenario.make_request(dataset)
+            measure(client, scenario.method, url, data)
+        samples = []
+        for _ in range(requests):
+            client, url, data = scenario.make_request(dataset)
+            samples.append(measure(client, scenario.method, url, data))
+        results[scenario.name] = summarize(samples)
+    return results
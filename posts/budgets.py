@@ -0,0 +1,174 @@
+import logging
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+from django.dispatch import Signal
+from django.template.backends.django import Template
+
+logger = logging.getLogger("posts.budgets")
+
+# Отправляется после каждого запроса, к которому применялась проверка.
+request_measured = Signal(providing_args=["url_name", "stats"])
+
+# Строгий режим роняет запрос только по числу запросов: время зависит
+# от загрузки машины, его превышение всегда лишь предупреждение.
+STRICT_LIMITS = ("queries",)
+
+_local = threading.local()
+_original_render = Template.render
+# Сколько запросов сейчас измеряется: пока их нет, Template.render
+# не подменён.
+_measuring = 0
+_measuring_lock = threading.Lock()
+
+
+class BudgetExceeded(AssertionError):
+    pass
+
+
+class RequestStats:
+    """SQL-запросы и время рендеринга шаблонов одного HTTP-запроса."""
+
+    def __init__(self):
+        self.queries = []
+        self.render_seconds = 0.0
+        self.render_depth = 0
+
+        self.paused = False
+
+    def __call__(self, execute, sql, params, many, context):
+        if self.paused:
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - started))
+
+    def measured(self):
+        return {
+            "queries": len(self.queries),
+            "db_ms": sum(seconds for _, seconds in self.queries) * 1000,
+            "render_ms": self.render_seconds * 1000,
+        }
+
+
+def _timed_render(self, context=None, request=None):
+    stats = getattr(_local, "stats", None)
+    if stats is None or stats.render_depth:
+        return _original_render(self, context, request)
+    stats.render_depth += 1
+    started = time.perf_counter()
+    try:
+        return _original_render(self, context, request)
+    finally:
+        stats.render_seconds += time.perf_counter() - started
+        stats.render_depth -= 1
+
+
+@contextmanager
+def _timing_renders():
+    global _measuring
+    with _measuring_lock:
+        if not _measuring:
+            Template.render = _timed_render
+        _measuring += 1
+    try:
+        yield
+    finally:
+        with _measuring_lock:
+            _measuring -= 1
+            if not _measuring:
+                Template.render = _original_render
+
+
+@contextmanager
+def unmeasured():
+    """Запросы внутри блока не входят в бюджет текущего запроса.
+
+    Так выполняются фоновые задачи в режиме POSTS_TASKS_EAGER: их
+    стоимость — не стоимость страницы.
+    """
+    stats = getattr(_local, "stats", None)
+    if stats is None or stats.paused:
+        yield
+        return
+    stats.paused = True
+    try:
+        yield
+    finally:
+        stats.paused = False
+
+
+def overruns(measured, budget):
+    """Показатели, вышедшие за бюджет: {имя: (значение, лимит)}."""
+    return {
+        name: (measured[name], limit)
+        for name, limit in budget.items()
+        if measured[name] > limit
+    }
+
+
+def describe_queries(queries):
+    """Список запросов, самые частые сверху: так сразу видно N+1."""
+    counts = Counter(sql for sql, _ in queries)
+    return "\n".join(f"{count} x {sql}" for sql, count in counts.most_common())
+
+
+class RequestBudgetMiddleware:
+    """Считает SQL-запросы, время в базе и время рендеринга шаблонов
+    и сверяет их с REQUEST_BUDGETS по имени URL (вместе с пространством
+    имён, например api:posts).
+
+    В строгом режиме (REQUEST_BUDGETS_STRICT, его включает плагин
+    pytest) превышение числа запросов — ошибка со списком запросов.
+    Остальное, и всё вне строгого режима, — предупреждение в лог
+    posts.budgets.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = RequestStats()
+        _local.stats = stats
+        try:
+            with ExitStack() as stack:
+                stack.enter_context(_timing_renders())
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(stats))
+                response = self.get_response(request)
+        finally:
+            _local.stats = None
+
+        match = request.resolver_match
+        url_name = match.view_name if match else None
+        request_measured.send(sender=self.__class__, url_name=url_name,
+                              stats=stats)
+        budget = settings.REQUEST_BUDGETS.get(url_name)
+        if budget:
+            self.check(url_name, stats, budget)
+        return response
+
+    def check(self, url_name, stats, budget):
+        measured = stats.measured()
+        exceeded = overruns(measured, budget)
+        if not exceeded:
+            return
+        strict = {name: values for name, values in exceeded.items()
+                  if name in STRICT_LIMITS}
+        if settings.REQUEST_BUDGETS_STRICT and strict:
+            details = ", ".join(
+                f"{name} {value:g} > {limit:g}"
+                for name, (value, limit) in strict.items())
+            raise BudgetExceeded(
+                f"Превышен бюджет {url_name}: {details}\n"
+                f"{describe_queries(stats.queries)}")
+        logger.warning(
+            "Request budget exceeded for %s", url_name,
+            extra={"url_name": url_name, "measured": measured,
+                   "budget": budget, "exceeded": sorted(exceeded)})
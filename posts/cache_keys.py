@@ -0,0 +1,86 @@
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+# Поколения не ограничены по времени жизни: ключ фрагмента меняется
+# при каждом изменении данных, старые фрагменты просто вытесняются.
+GENERATION_TIMEOUT = None
+
+
+def _generation_key(scope, pk=None):
+    return f"gen:{scope}:{pk}" if pk is not None else f"gen:{scope}"
+
+
+# Общее поколение входит в каждое: его сдвиг (bump_site) сбрасывает все
+# кэши сразу, например после массовой загрузки данных.
+SITE_KEY = _generation_key("site")
+
+
+def generations(*scopes):
+    """Текущие поколения для списка (scope, pk) одним обращением к кэшу."""
+    keys = [_generation_key(*scope) for scope in scopes]
+    values = cache.get_many([SITE_KEY, *keys])
+    missing = {key: time.time_ns() for key in [SITE_KEY, *keys]
+               if key not in values}
+    if missing:
+        cache.set_many(missing, GENERATION_TIMEOUT)
+        values.update(missing)
+    site = values[SITE_KEY]
+    return [f"{site}.{values[key]}" for key in keys]
+
+
+def _bump(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Счётчик вытеснен: начинаем с метки времени, чтобы новое
+        # поколение не совпало ни с одним из прежних.
+        cache.set(key, time.time_ns(), GENERATION_TIMEOUT)
+
+
+def bump_now(*scopes):
+    """Сдвигает поколения сразу, не дожидаясь коммита."""
+    for scope in scopes:
+        if None not in scope:
+            _bump(_generation_key(*scope))
+
+
+def bump(*scopes):
+    """Сдвигает поколения после коммита текущей транзакции."""
+    keys = [_generation_key(*scope) for scope in scopes if None not in scope]
+
+    def run():
+        for key in keys:
+            _bump(key)
+
+    transaction.on_commit(run)
+
+
+def bump_site():
+    """Сбрасывает все кэши, построенные на поколениях, после коммита."""
+    bump(("site",))
+
+
+def bump_post(post_id, author_id, *group_ids):
+    """Сбрасывает всё, где может быть показан пост."""
+    bump(("posts",), ("post", post_id), ("author", author_id),
+         *(("group", group_id) for group_id in group_ids))
+
+
+# Имена авторов и комментаторов и названия групп видны почти на каждой
+# странице; их меняют редко, поэтому хватает общих поколений.
+NAMES = (("users",), ("groups",))
+
+
+def feed_cache_key(view, request, *scopes):
+    """Ключ фрагмента ленты: вид, курсор страницы, зритель и поколения
+    всех сущностей, от которых зависит содержимое, включая NAMES."""
+    viewer = request.user.pk if request.user.is_authenticated else "anon"
+    cursor = "&".join(
+        f"{name}={request.GET[name]}"
+        for name in ("after", "before", "page") if name in request.GET
+    )
+    parts = [view, cursor, viewer]
+    parts.extend(generations(*scopes, *NAMES))
+    return ":".join(str(part) for part in parts)
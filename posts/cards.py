@@ -0,0 +1,66 @@
+"""Кэш HTML карточек постов (posts/includes/post_item.html).
+
+Карточка одинакова для всех зрителей, кроме ссылки «Редактировать» у
+автора, поэтому в кэше лежит общий HTML с меткой на месте ссылки, а
+ссылка подставляется при сборке страницы. Ключ карточки содержит
+поколения поста (см. cache_keys.bump_post), его автора и группы: правка,
+комментарий, готовая миниатюра, смена имени автора или названия группы
+дают новый ключ. Карточки страницы читаются одним cache.get_many,
+рендерятся только промахи.
+"""
+from itertools import chain
+
+from django.core.cache import cache
+from django.template.loader import get_template, render_to_string
+from django.utils.safestring import mark_safe
+
+from posts.cache_keys import generations
+from posts.routing import current_replica
+
+# Устаревшие карточки не читаются (ключ сменился) и просто вытесняются.
+CARD_TIMEOUT = 24 * 60 * 60
+EDIT_SLOT = mark_safe("<!-- post-edit-link -->")
+
+
+def card_scopes(post):
+    """Поколения, от которых зависит HTML карточки."""
+    scopes = [("post", post.pk), ("user", post.author_id)]
+    if post.group_id is not None:
+        scopes.append(("group_meta", post.group_id))
+    return scopes
+
+
+def card_keys(posts):
+    scopes = [card_scopes(post) for post in posts]
+    versions = iter(generations(*chain.from_iterable(scopes)))
+    return [
+        ":".join(["card", str(post.pk)]
+                 + [str(next(versions)) for _ in post_scopes])
+        for post, post_scopes in zip(posts, scopes)
+    ]
+
+
+def render_cards(posts, user=None):
+    """HTML карточек posts в том же порядке, с учётом зрителя user."""
+    posts = list(posts)
+    if not posts:
+        return []
+    keys = card_keys(posts)
+    cached = cache.get_many(keys)
+    template = get_template("posts/includes/post_item.html")
+    rendered = {}
+    cards = []
+    for post, key in zip(posts, keys):
+        html = cached.get(key)
+        if html is None:
+            html = rendered[key] = template.render(
+                {"post": post, "edit_slot": EDIT_SLOT})
+        if user is not None and user.is_authenticated and (
+                post.author_id == user.pk):
+            html = html.replace(EDIT_SLOT, render_to_string(
+                "posts/includes/post_edit_link.html", {"post": post}), 1)
+        cards.append(html)
+    # Карточки, построенные по реплике, могут быть старее своего ключа.
+    if rendered and current_replica() is None:
+        cache.set_many(rendered, CARD_TIMEOUT)
+    return cards
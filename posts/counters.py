@@ -0,0 +1,84 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from posts import timelines
+from posts.models import Follow, Post, User, UserStats
+from posts.queries import chunked_ids, comments_count, related_count
+from posts.tasks import enqueue
+
+
+def bump_user(user_id, field, delta):
+    """Атомарно меняет счётчик пользователя на delta."""
+    if user_id is None:
+        return
+    stats = UserStats.objects.filter(user_id=user_id)
+    if delta < 0:
+        if stats.filter(**{f"{field}__gte": -delta}).update(
+                **{field: F(field) + delta}) and field == "followers_count":
+            _check_fanout_limit(user_id, delta)
+        return
+    with transaction.atomic():
+        if not stats.update(**{field: F(field) + delta}):
+            _, created = UserStats.objects.get_or_create(
+                user_id=user_id, defaults={field: delta})
+            if not created:
+                stats.update(**{field: F(field) + delta})
+    if field == "followers_count":
+        _check_fanout_limit(user_id, delta)
+
+
+def _check_fanout_limit(user_id, delta):
+    """Если число подписчиков перешло TIMELINE_FANOUT_LIMIT, ставит в
+    очередь перекладку лент: посты автора, опубликованные по одну сторону
+    порога, иначе не попадут в ленты по другую."""
+    count = UserStats.objects.filter(user_id=user_id).values_list(
+        "followers_count", flat=True).first()
+    if count is None:
+        return
+    limit = settings.TIMELINE_FANOUT_LIMIT
+    if count - delta <= limit < count:
+        enqueue(timelines.fan_in_author, user_id)
+    elif count <= limit < count - delta:
+        enqueue(timelines.fan_out_author, user_id)
+
+
+def bump_comments(post_id, delta):
+    if post_id is None:
+        return
+    Post.objects.filter(pk=post_id, comment_count__gte=-delta).update(
+        comment_count=F("comment_count") + delta)
+
+
+def repair_posts(post_ids):
+    """Пересчитывает comment_count у переданных постов."""
+    return Post.objects.filter(pk__in=post_ids).update(
+        comment_count=comments_count())
+
+
+def repair_users(user_ids):
+    """Пересчитывает счётчики переданных пользователей."""
+    existing = set(UserStats.objects.filter(
+        user_id__in=user_ids).values_list("user_id", flat=True))
+    UserStats.objects.bulk_create(
+        [UserStats(user_id=user_id) for user_id in user_ids
+         if user_id not in existing],
+        ignore_conflicts=True,
+    )
+    return UserStats.objects.filter(user_id__in=user_ids).update(
+        posts_count=related_count(Post, "author"),
+        followers_count=related_count(Follow, "author"),
+        following_count=related_count(Follow, "user"),
+    )
+
+
+def repair_all(chunk_size=1000):
+    """Пересчитывает все счётчики порциями, каждая в своей транзакции."""
+    fixed_posts = fixed_users = 0
+    for chunk in chunked_ids(Post.objects.all(), chunk_size):
+        with transaction.atomic():
+            fixed_posts += repair_posts(chunk)
+    for chunk in chunked_ids(User.objects.all(), chunk_size):
+        with transaction.atomic():
+            fixed_users += repair_users(chunk)
+    return fixed_posts, fixed_users
@@ -0,0 +1,112 @@
+"""Ленты RSS и Atom: весь сайт, группа и автор.
+
+Посты берутся тем же запросом, что и для карточек ленты, а готовый XML
+кэшируется по поколениям области (см. feed_cache) до изменения постов.
+"""
+from django.contrib.syndication.views import Feed
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.feedgenerator import Atom1Feed
+from django.utils.text import Truncator
+
+from posts.models import Group, Post, User
+from posts.page_cache import (feed_cache, group_scope, index_scope,
+                              profile_scope)
+from posts.queries import feed_queryset
+
+FEED_SIZE = 20
+
+
+class PostFeed(Feed):
+    def posts(self, obj):
+        return Post.objects.all()
+
+    def items(self, obj):
+        return feed_queryset(self.posts(obj))[:FEED_SIZE]
+
+    def item_title(self, item):
+        return Truncator(item.text).words(8)
+
+    def item_description(self, item):
+        return item.text
+
+    def item_link(self, item):
+        return reverse("post", args=[item.author.username, item.pk])
+
+    def item_author_name(self, item):
+        return item.author.get_full_name() or item.author.username
+
+    def item_pubdate(self, item):
+        return item.pub_date
+
+    def item_categories(self, item):
+        return [item.group.title] if item.group_id else []
+
+
+class SiteFeed(PostFeed):
+    title = "Yatube: новые записи"
+    description = "Последние записи на Yatube"
+
+    def link(self):
+        return reverse("index")
+
+
+class GroupFeed(PostFeed):
+    def get_object(self, request, slug):
+        return get_object_or_404(Group, slug=slug)
+
+    def posts(self, obj):
+        return Post.objects.filter(group=obj)
+
+    def title(self, obj):
+        return f"Yatube: {obj.title}"
+
+    def description(self, obj):
+        return obj.description
+
+    def link(self, obj):
+        return reverse("group", args=[obj.slug])
+
+
+class AuthorFeed(PostFeed):
+    def get_object(self, request, username):
+        return get_object_or_404(User, username=username)
+
+    def posts(self, obj):
+        return Post.objects.filter(author=obj)
+
+    def title(self, obj):
+        return f"Yatube: {obj.get_full_name() or obj.username}"
+
+    def description(self, obj):
+        return f"Записи пользователя {obj.username}"
+
+    def link(self, obj):
+        return reverse("profile", args=[obj.username])
+
+
+class SiteAtomFeed(SiteFeed):
+    feed_type = Atom1Feed
+    subtitle = SiteFeed.description
+
+
+class GroupAtomFeed(GroupFeed):
+    feed_type = Atom1Feed
+
+    def subtitle(self, obj):
+        return self.description(obj)
+
+
+class AuthorAtomFeed(AuthorFeed):
+    feed_type = Atom1Feed
+
+    def subtitle(self, obj):
+        return self.description(obj)
+
+
+site_rss = feed_cache(index_scope)(SiteFeed())
+site_atom = feed_cache(index_scope)(SiteAtomFeed())
+group_rss = feed_cache(group_scope)(GroupFeed())
+group_atom = feed_cache(group_scope)(GroupAtomFeed())
+author_rss = feed_cache(profile_scope)(AuthorFeed())
+author_atom = feed_cache(profile_scope)(AuthorAtomFeed())
@@ -0,0 +1,49 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from posts import thumbnails
+from posts.models import Post
+
+
+def _generate(post_id):
+    return thumbnails.generate_for_post(post_id)
+
+
+class Command(BaseCommand):
+    help = "Строит миниатюры карточек для уже загруженных картинок постов"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4)
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def batches(self, batch_size):
+        posts = Post.objects.exclude(image="").exclude(image=None).filter(
+            thumbnail="")
+        last_pk = 0
+        while True:
+            batch = list(
+                posts.filter(pk__gt=last_pk).order_by("pk")
+                .values_list("pk", flat=True)[:batch_size]
+            )
+            if not batch:
+                return
+            last_pk = batch[-1]
+            # Рабочие процессы создаются через fork и не должны
+            # унаследовать открытое соединение с базой.
+            connections.close_all()
+            yield batch
+
+    def handle(self, *args, **options):
+        done = failed = 0
+        workers = options["workers"]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for post_ids in self.batches(options["batch_size"]):
+                chunksize = max(len(post_ids) // (workers * 4), 1)
+                for ok in pool.map(_generate, post_ids, chunksize=chunksize):
+                    if ok:
+                        done += 1
+                    else:
+                        failed += 1
+        self.stdout.write(f"Готово: {done}, с ошибками: {failed}")
@@ -0,0 +1,50 @@
+import os
+import statistics
+import tempfile
+import time
+
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+
+from yatube.sqlite_cache import SQLiteCache
+
+
+class Command(BaseCommand):
+    help = "Сравнивает задержку попаданий SQLiteCache и LocMemCache"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--keys", type=int, default=1000)
+        parser.add_argument("--reads", type=int, default=20000)
+        parser.add_argument("--value-size", type=int, default=2048)
+
+    def measure(self, cache, options):
+        value = "x" * options["value_size"]
+        keys = [f"bench:{number}" for number in range(options["keys"])]
+        cache.set_many({key: value for key in keys}, None)
+        timings = []
+        for number in range(options["reads"]):
+            key = keys[number % len(keys)]
+            started = time.perf_counter()
+            cache.get(key)
+            timings.append(time.perf_counter() - started)
+        timings.sort()
+        return {
+            "p50": timings[len(timings) // 2],
+            "p99": timings[int(len(timings) * 0.99)],
+            "mean": statistics.mean(timings),
+        }
+
+    def handle(self, *args, **options):
+        params = {"OPTIONS": {"MAX_ENTRIES": options["keys"] * 2}}
+        with tempfile.TemporaryDirectory() as directory:
+            backends = (
+                ("LocMemCache", LocMemCache("bench", params)),
+                ("SQLiteCache", SQLiteCache(
+                    os.path.join(directory, "cache.sqlite3"), params)),
+            )
+            for name, cache in backends:
+                result = self.measure(cache, options)
+                self.stdout.write(
+                    f"{name:12} " + "  ".join(
+                        f"{label}={value * 1e6:.1f}us"
+                        for label, value in result.items()))
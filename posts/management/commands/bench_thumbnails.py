@@ -0,0 +1,97 @@
+import io
+import shutil
+import tempfile
+import time
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.template import Context, Template
+from django.test.utils import CaptureQueriesContext, override_settings
+from PIL import Image
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.base import add_prefix
+
+from posts import thumbnails
+from posts.models import Post, User
+
+# Прежний способ: {% thumbnail %} ищет миниатюру в хранилище sorl.
+LOOKUP = Template(
+    '{% load thumbnail %}{% for post in posts %}'
+    '{% thumbnail post.image "960x339" crop="center" upscale=True as im %}'
+    '<img src="{{ im.url }}">{% endthumbnail %}{% endfor %}'
+)
+# Новый способ: путь и размеры уже лежат в строке поста.
+STORED = Template(
+    '{% for post in posts %}{% if post.thumbnail %}'
+    '<img src="{{ post.thumbnail_url }}" width="{{ post.thumbnail_width }}"'
+    ' height="{{ post.thumbnail_height }}">{% endif %}{% endfor %}'
+)
+
+
+def _image():
+    data = io.BytesIO()
+    Image.new("RGB", (1280, 720), "steelblue").save(data, "JPEG")
+    return SimpleUploadedFile("bench.jpg", data.getvalue(),
+                              content_type="image/jpeg")
+
+
+class Command(BaseCommand):
+    help = "Сравнивает рендеринг миниатюр ленты через sorl и из строки поста"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--cards", type=int, default=10)
+        parser.add_argument("--repeat", type=int, default=200)
+
+    def measure(self, template, posts, repeat, before=None):
+        context = Context({"posts": posts})
+        elapsed = 0
+        for number in range(repeat):
+            if before is not None:
+                before()
+            if number == 0:
+                with CaptureQueriesContext(connection) as queries:
+                    template.render(context)
+                continue
+            started = time.perf_counter()
+            template.render(context)
+            elapsed += time.perf_counter() - started
+        return len(queries), elapsed / max(repeat - 1, 1)
+
+    def handle(self, *args, **options):
+        media = tempfile.mkdtemp()
+        try:
+            with override_settings(MEDIA_ROOT=media), transaction.atomic():
+                self.run(options)
+                transaction.set_rollback(True)
+        finally:
+            shutil.rmtree(media, ignore_errors=True)
+
+    def run(self, options):
+        author = User.objects.create_user(username="bench_thumbnails")
+        for number in range(options["cards"]):
+            post = Post.objects.create(text=f"bench {number}", author=author,
+                                       image=_image())
+            thumbnails.generate_for_post(post.pk)
+        posts = list(Post.objects.filter(author=author))
+        # Без кэша sorl каждая карточка идёт в таблицу thumbnail_kvstore.
+        kvstore_keys = [
+            add_prefix(ImageFile(post.thumbnail, default.storage).key)
+            for post in posts
+        ]
+
+        def evict():
+            default.kvstore.cache.delete_many(kvstore_keys)
+
+        runs = (
+            ("sorl, кэш", LOOKUP, None),
+            ("sorl, без кэша", LOOKUP, evict),
+            ("из строки", STORED, None),
+        )
+        for name, template, before in runs:
+            queries, elapsed = self.measure(template, posts,
+                                            options["repeat"], before)
+            self.stdout.write(
+                f"{name:15} {options['cards']} карточек: "
+                f"{queries} SQL-запросов, {elapsed * 1000:.2f} мс")
@@ -0,0 +1,182 @@
+import json
+import os
+import random
+import shutil
+import tempfile
+from datetime import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.test.utils import (override_settings, setup_databases,
+                               teardown_databases)
+from django.urls import reverse
+
+from posts import benchmarks
+from posts.models import Comment, Follow, Group, Post, User
+from posts.seeding import Seeder
+
+SAMPLE_SIZE = 1000
+
+
+class Dataset:
+    """Случайные выборки объектов, по которым строятся адреса запросов."""
+
+    def __init__(self, seed, logged_in):
+        self.random = random.Random(seed)
+        self.usernames = list(
+            User.objects.filter(posts__isnull=False).distinct()
+            .values_list("username", flat=True)[:SAMPLE_SIZE])
+        self.slugs = list(Group.objects.values_list(
+            "slug", flat=True)[:SAMPLE_SIZE])
+        last_pk = Post.objects.order_by("-pk").values_list(
+            "pk", flat=True).first() or 0
+        candidates = [self.random.randint(1, last_pk)
+                      for _ in range(SAMPLE_SIZE)]
+        self.posts = list(Post.objects.filter(
+            pk__in=candidates, author__isnull=False).values_list(
+            "author__username", "pk"))
+        reader_id = Follow.objects.values_list("user_id", flat=True).first()
+        self.reader = User.objects.get(pk=reader_id)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        self.anonymous_client = Client()
+        self.read_client = (self.reader_client if logged_in
+                            else self.anonymous_client)
+
+    def counts(self):
+        return {
+            "users": User.objects.count(),
+            "groups": Group.objects.count(),
+            "posts": Post.objects.count(),
+            "comments": Comment.objects.count(),
+            "follows": Follow.objects.count(),
+        }
+
+
+def scenarios():
+    def index(data):
+        return data.read_client, reverse("index"), None
+
+    def group(data):
+        slug = data.random.choice(data.slugs)
+        return data.read_client, reverse("group", args=[slug]), None
+
+    def profile(data):
+        username = data.random.choice(data.usernames)
+        return data.read_client, reverse("profile", args=[username]), None
+
+    def post(data):
+        username, post_id = data.random.choice(data.posts)
+        return (data.read_client,
+                reverse("post", args=[username, post_id]), None)
+
+    def follow_index(data):
+        return data.reader_client, reverse("follow_index"), None
+
+    def add_comment(data):
+        username, post_id = data.random.choice(data.posts)
+        return (data.reader_client,
+                reverse("add_comment", args=[username, post_id]),
+                {"text": "Комментарий из бенчмарка"})
+
+    def api_index(data):
+        return data.read_client, reverse("api:posts"), None
+
+    def api_group(data):
+        slug = data.random.choice(data.slugs)
+        return (data.read_client, reverse("api:group_posts", args=[slug]),
+                None)
+
+    def api_profile(data):
+        username = data.random.choice(data.usernames)
+        return (data.read_client,
+                reverse("api:user_posts", args=[username]), None)
+
+    def api_post(data):
+        _, post_id = data.random.choice(data.posts)
+        return data.read_client, reverse("api:post", args=[post_id]), None
+
+    return [
+        benchmarks.Scenario("index", "get", index),
+        benchmarks.Scenario("group", "get", group),
+        benchmarks.Scenario("profile", "get", profile),
+        benchmarks.Scenario("post", "get", post),
+        benchmarks.Scenario("follow_index", "get", follow_index),
+        benchmarks.Scenario("add_comment", "post", add_comment),
+        benchmarks.Scenario("api_index", "get", api_index),
+        benchmarks.Scenario("api_group", "get", api_group),
+        benchmarks.Scenario("api_profile", "get", api_profile),
+        benchmarks.Scenario("api_post", "get", api_post),
+    ]
+
+
+class Command(BaseCommand):
+    help = ("Наполняет тестовую базу синтетическими данными и измеряет "
+            "задержку, число запросов и размер ответа основных страниц")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--groups", type=int, default=20)
+        parser.add_argument("--posts", type=int, default=10000)
+        parser.add_argument("--comments", type=int, default=20000)
+        parser.add_argument("--follows", type=int, default=20000)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--requests", type=int, default=100)
+        parser.add_argument("--warmup", type=int, default=5)
+        parser.add_argument(
+            "--logged-in", action="store_true",
+            help="Открывать страницы чтения залогиненным пользователем")
+        parser.add_argument(
+            "--keepdb", action="store_true",
+            help="Не удалять тестовую базу и не наполнять её повторно")
+        parser.add_argument("--output", default=None,
+                            help="Файл для результатов в формате JSON")
+
+    def handle(self, *args, **options):
+        started = datetime.now()
+        cache_dir = tempfile.mkdtemp()
+        cache_settings = {"default": {
+            **settings.CACHES["default"],
+            "LOCATION": os.path.join(cache_dir, "cache.sqlite3"),
+        }}
+        old_config = setup_databases(verbosity=0, interactive=False,
+                                     keepdb=options["keepdb"])
+        try:
+            with override_settings(DEBUG=False, POSTS_TASKS_EAGER=True,
+                                   CACHES=cache_settings, RATE_LIMITS={}):
+                report = self.bench(options)
+        finally:
+            teardown_databases(old_config, verbosity=0,
+                               keepdb=options["keepdb"])
+            shutil.rmtree(cache_dir, ignore_errors=True)
+        report["started"] = started.isoformat()
+        output = options["output"] or started.strftime(
+            "bench-views-%Y%m%d-%H%M%S.json")
+        with open(output, "w") as result_file:
+            json.dump(report, result_file, indent=2, ensure_ascii=False)
+        for name, result in report["results"].items():
+            self.stdout.write(
+                f"{name:14} p50={result['p50_ms']:.1f}ms "
+                f"p95={result['p95_ms']:.1f}ms p99={result['p99_ms']:.1f}ms "
+                f"queries={result['queries_mean']:.1f} "
+                f"bytes={result['bytes_mean']:.0f}")
+        self.stdout.write(f"Результаты сохранены в {output}")
+
+    def bench(self, options):
+        if not (options["keepdb"] and Post.objects.exists()):
+            Seeder(seed=options["seed"],
+                   batch_size=options["batch_size"]).run(
+                users=options["users"], groups=options["groups"],
+                posts=options["posts"], comments=options["comments"],
+                follows=options["follows"])
+        dataset = Dataset(options["seed"], options["logged_in"])
+        results = benchmarks.run(scenarios(), dataset, options["requests"],
+                                 warmup=options["warmup"])
+        return {
+            "dataset": dataset.counts(),
+            "options": {key: options[key] for key in (
+                "seed", "requests", "warmup", "logged_in")},
+            "results": results,
+        }
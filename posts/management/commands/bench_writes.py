@@ -0,0 +1,190 @@
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections
+from django.test.utils import (override_settings, setup_databases,
+                               teardown_databases)
+
+from posts import benchmarks, writes
+from posts.models import Comment, Follow, Group, Post, User
+from posts.paginators import CursorPaginator
+from posts.queries import feed_queryset
+from posts.seeding import Seeder
+
+
+def toggle_follow(user_id, author_id):
+    follow, created = Follow.objects.get_or_create(user_id=user_id,
+                                                   author_id=author_id)
+    if not created:
+        follow.delete()
+
+
+class Load:
+    """Смесь операций как у страниц: ленты групп, комментарии и подписки."""
+
+    def __init__(self, read_share):
+        self.read_share = read_share
+        self.user_ids = list(User.objects.values_list("pk", flat=True))
+        self.group_ids = list(Group.objects.values_list("pk", flat=True))
+        self.post_ids = list(Post.objects.values_list("pk", flat=True))
+
+    def read(self, rnd):
+        paginator = CursorPaginator(feed_queryset(
+            Post.objects.filter(group_id=rnd.choice(self.group_ids))), 10)
+        list(paginator.get_page({}))
+
+    def comment(self, rnd):
+        writes.submit(Comment.objects.create,
+                      post_id=rnd.choice(self.post_ids),
+                      author_id=rnd.choice(self.user_ids),
+                      text="Комментарий из бенчмарка")
+
+    def follow(self, rnd):
+        user_id, author_id = rnd.sample(self.user_ids, 2)
+        writes.submit(toggle_follow, user_id, author_id)
+
+    def next_operation(self, rnd):
+        if rnd.random() < self.read_share:
+            return "read", self.read
+        if rnd.random() < 0.5:
+            return "write", self.comment
+        return "write", self.follow
+
+
+def run_worker(load, seed, deadline, samples):
+    rnd = random.Random(seed)
+    try:
+        while time.perf_counter() < deadline:
+            kind, operation = load.next_operation(rnd)
+            started = time.perf_counter()
+            try:
+                operation(rnd)
+            except OperationalError:
+                samples.append((kind, time.perf_counter() - started, False))
+            else:
+                samples.append((kind, time.perf_counter() - started, True))
+    finally:
+        connections.close_all()
+
+
+def summarize(samples, seconds):
+    result = {"ops_per_second": len(samples) / seconds}
+    for kind in ("read", "write"):
+        timings = [elapsed for sample_kind, elapsed, ok in samples
+                   if sample_kind == kind]
+        result[f"{kind}s"] = len(timings)
+        result[f"{kind}_errors"] = sum(
+            1 for sample_kind, _, ok in samples
+            if sample_kind == kind and not ok)
+        if timings:
+            result[f"{kind}_p50_ms"] = benchmarks.percentile(
+                timings, 0.50) * 1000
+            result[f"{kind}_p95_ms"] = benchmarks.percentile(
+                timings, 0.95) * 1000
+    result["writes_per_second"] = result["writes"] / seconds
+    return result
+
+
+class Command(BaseCommand):
+    help = ("Смешанная нагрузка чтения и записи из нескольких потоков на "
+            "файловой базе SQLite: сравнивает обычный журнал, WAL и "
+            "очередь записи с разным размером пачки")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--seconds", type=float, default=5.0,
+                            help="Длительность нагрузки на каждый режим")
+        parser.add_argument("--read-share", type=float, default=0.8)
+        parser.add_argument("--batch-sizes", default="1,8,32",
+                            help="Размеры пачки очереди записи через запятую")
+        parser.add_argument("--users", type=int, default=500)
+        parser.add_argument("--groups", type=int, default=20)
+        parser.add_argument("--posts", type=int, default=5000)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", default=None,
+                            help="Файл для результатов в формате JSON")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("Бенчмарк рассчитан на SQLite")
+        started = datetime.now()
+        work_dir = tempfile.mkdtemp()
+        # Блокировки SQLite проявляются только на файле, поэтому тестовая
+        # база создаётся не в памяти.
+        connection.settings_dict["TEST"]["NAME"] = os.path.join(
+            work_dir, "bench.sqlite3")
+        cache_settings = {"default": {
+            **settings.CACHES["default"],
+            "LOCATION": os.path.join(work_dir, "cache.sqlite3"),
+        }}
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            with override_settings(DEBUG=False, POSTS_TASKS_EAGER=True,
+                                   CACHES=cache_settings):
+                report = self.bench(options)
+        finally:
+            connections.close_all()
+            teardown_databases(old_config, verbosity=0)
+            shutil.rmtree(work_dir, ignore_errors=True)
+        report["started"] = started.isoformat()
+        output = options["output"] or started.strftime(
+            "bench-writes-%Y%m%d-%H%M%S.json")
+        with open(output, "w") as result_file:
+            json.dump(report, result_file, indent=2, ensure_ascii=False)
+        for name, result in report["results"].items():
+            self.stdout.write(
+                f"{name:14} ops/s={result['ops_per_second']:.0f} "
+                f"writes/s={result['writes_per_second']:.0f} "
+                f"read p95={result.get('read_p95_ms', 0):.1f}ms "
+                f"write p50={result.get('write_p50_ms', 0):.1f}ms "
+                f"p95={result.get('write_p95_ms', 0):.1f}ms "
+                f"errors={result['read_errors'] + result['write_errors']}")
+        self.stdout.write(f"Результаты сохранены в {output}")
+
+    def modes(self, options):
+        yield "delete", {"SQLITE_WAL": False, "WRITE_QUEUE": False}
+        yield "wal", {"SQLITE_WAL": True, "WRITE_QUEUE": False}
+        for size in options["batch_sizes"].split(","):
+            yield f"wal+queue/{size}", {
+                "SQLITE_WAL": True, "WRITE_QUEUE": True,
+                "WRITE_QUEUE_BATCH_SIZE": int(size)}
+
+    def bench(self, options):
+        Seeder(seed=options["seed"]).run(
+            users=options["users"], groups=options["groups"],
+            posts=options["posts"], comments=0, follows=0)
+        load = Load(options["read_share"])
+        results = {}
+        for name, mode in self.modes(options):
+            with override_settings(**mode):
+                connections.close_all()
+                with connection.cursor() as cursor:
+                    cursor.execute("PRAGMA journal_mode=%s" % (
+                        "WAL" if mode["SQLITE_WAL"] else "DELETE"))
+                connections.close_all()
+                samples = []
+                deadline = time.perf_counter() + options["seconds"]
+                threads = [
+                    threading.Thread(target=run_worker, args=(
+                        load, options["seed"] + number, deadline, samples))
+                    for number in range(options["threads"])
+                ]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                results[name] = summarize(samples, options["seconds"])
+        return {
+            "options": {key: options[key] for key in (
+                "threads", "seconds", "read_share", "users", "groups",
+                "posts", "seed")},
+            "results": results,
+        }
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import suggestions
+
+
+class Command(BaseCommand):
+    help = ("Пересчитывает рекомендации «на кого подписаться» для "
+            "пользователей, чьи подписки изменились, или для всех (--full)")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--full", action="store_true",
+                            help="Пересчитать всех пользователей")
+        parser.add_argument("--top", type=int, default=suggestions.TOP,
+                            help="Сколько рекомендаций хранить на каждого")
+        parser.add_argument("--chunk-size", type=int,
+                            default=suggestions.CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        users, stored = suggestions.refresh(
+            full=options["full"], top=options["top"],
+            chunk_size=options["chunk_size"], log=self.stdout.write)
+        self.stdout.write(
+            f"Пересчитано пользователей: {users}, рекомендаций: {stored} "
+            f"за {time.perf_counter() - started:.1f} с")
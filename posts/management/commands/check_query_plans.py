@@ -0,0 +1,106 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+
+from posts import suggestions, timelines, trending, views
+from posts.models import Follow, Group, Post, User
+from posts.paginators import CursorPaginator, encode_cursor
+from posts.queries import feed_queryset
+
+
+def _first_pk(queryset):
+    return queryset.order_by("pk").values_list("pk", flat=True).first() or 1
+
+
+CURSOR = encode_cursor(timezone.now(), 1)
+PAGE_PARAMS = ({}, {"after": CURSOR}, {"before": CURSOR})
+
+
+def _pages(paginator):
+    """Первая страница и страницы по курсорам, как их запрашивают ленты."""
+    for params in PAGE_PARAMS:
+        paginator.get_page(params)
+
+
+def _feed_pages(queryset, per_page, **kwargs):
+    _pages(CursorPaginator(feed_queryset(queryset), per_page, **kwargs))
+
+
+def _follow_pages(user):
+    _pages(timelines.paginator(user, 6, wrap=feed_queryset))
+
+
+def _pulled_follow_pages(user):
+    """Лента, где все авторы читаются при чтении: проверяет слияние их
+    постов с записями ленты."""
+    with override_settings(TIMELINE_FANOUT_LIMIT=0):
+        _follow_pages(user)
+
+
+def _comment_pages(post_id):
+    post = Post(pk=post_id)
+    for params in PAGE_PARAMS:
+        views.comments_page(post, params)
+
+
+def feed_queries():
+    """Пары (название, функция), выполняющая запросы одной ленты."""
+    user = User(pk=_first_pk(User.objects.filter(follower__isnull=False)))
+    author_id = _first_pk(User.objects.filter(posts__isnull=False))
+    group_id = _first_pk(Group.objects.all())
+    post_id = _first_pk(Post.objects.all())
+    return [
+        ("index", lambda: _feed_pages(Post.objects.all(), 10)),
+        ("group", lambda: _feed_pages(
+            Post.objects.filter(group_id=group_id), 10)),
+        ("profile", lambda: _feed_pages(
+            Post.objects.filter(author_id=author_id), 6)),
+        ("follow_index", lambda: _follow_pages(user)),
+        ("follow_index_pull", lambda: _pulled_follow_pages(user)),
+        ("comments", lambda: _comment_pages(post_id)),
+        ("followers", lambda: list(Follow.objects.filter(
+            author_id=author_id).values_list("user_id", flat=True))),
+        ("trending", lambda: (trending.ranked_post_ids(),
+                              trending.ranked_groups())),
+        ("suggestions", lambda: suggestions.for_user(user)),
+        ("following", lambda: Follow.objects.filter(
+            user_id=user.pk, author_id=author_id).exists()),
+    ]
+
+
+def plan_problems(detail):
+    if "USE TEMP B-TREE" in detail:
+        return "временная сортировка"
+    if detail.startswith("SCAN") and " USING " not in detail:
+        return "полный просмотр таблицы"
+    return None
+
+
+class Command(BaseCommand):
+    help = ("Проверяет через EXPLAIN QUERY PLAN, что запросы лент идут по "
+            "индексам: без полного просмотра таблиц и временной сортировки")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("Проверка поддерживает только SQLite")
+        failures = []
+        for name, run in feed_queries():
+            with CaptureQueriesContext(connection) as captured:
+                run()
+            for query in captured:
+                with connection.cursor() as cursor:
+                    cursor.execute("EXPLAIN QUERY PLAN " + query["sql"])
+                    plan = [row[-1] for row in cursor.fetchall()]
+                problems = [(detail, plan_problems(detail))
+                            for detail in plan if plan_problems(detail)]
+                if options["verbosity"] > 1 or problems:
+                    self.stdout.write(f"{name}: {query['sql']}")
+                    for detail in plan:
+                        self.stdout.write(f"    {detail}")
+                failures.extend(f"{name}: {problem} ({detail})"
+                                for detail, problem in problems)
+        if failures:
+            raise CommandError("Неудачные планы запросов:\n"
+                               + "\n".join(failures))
+        self.stdout.write("Все запросы лент используют индексы")
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from posts import trending
+
+
+class Command(BaseCommand):
+    help = ("Переносит точку отсчёта весов популярного на текущий момент "
+            "и удаляет остывшие записи; запускать периодически, например "
+            "раз в сутки")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rebuild", action="store_true",
+            help="Пересчитать веса заново по недавним постам и комментариям")
+
+    def handle(self, *args, **options):
+        if options["rebuild"]:
+            trending.rebuild()
+            self.stdout.write("Веса пересчитаны")
+            return
+        pruned = trending.compact()
+        self.stdout.write(f"Удалено остывших записей: {pruned}")
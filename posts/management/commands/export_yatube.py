@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = ("Выгружает пользователей, группы, посты, комментарии и подписки "
+            "в каталог: по файлу JSONL на модель")
+
+    def add_arguments(self, parser):
+        parser.add_argument("directory")
+        parser.add_argument("--chunk-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        counts = transfer.export(options["directory"],
+                                 chunk_size=options["chunk_size"])
+        for name, count in counts.items():
+            self.stdout.write(f"{name}: {count}")
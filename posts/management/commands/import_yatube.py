@@ -0,0 +1,35 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = ("Загружает выгрузку export_yatube. Прерванный импорт "
+            "продолжается с места остановки")
+
+    def add_arguments(self, parser):
+        parser.add_argument("directory")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--restart", action="store_true",
+            help="Забыть прогресс прошлого запуска и начать сначала")
+
+    def handle(self, *args, **options):
+        directory = options["directory"]
+        missing = [name for name in transfer.MODELS if not os.path.exists(
+            os.path.join(directory, f"{name}.jsonl"))]
+        if missing:
+            raise CommandError(f"В {directory} нет файлов: "
+                               + ", ".join(missing))
+        importer = transfer.Importer(
+            directory, batch_size=options["batch_size"],
+            restart=options["restart"], log=self.stdout.write)
+        try:
+            importer.run()
+        except transfer.ImportConflict as error:
+            raise CommandError(str(error))
+        finally:
+            importer.close()
+        self.stdout.write("Импорт завершён")
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import repair_all
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает денормализованные счётчики постов и пользователей"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        posts, users = repair_all(chunk_size=options["chunk_size"])
+        self.stdout.write(
+            f"Пересчитано постов: {posts}, пользователей: {users}")
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from posts import tasks
+
+
+class Command(BaseCommand):
+    help = ("Выполняет фоновые задачи (раскладку лент, миниатюры), "
+            "потерянные при остановке процесса; запускать периодически, "
+            "например раз в минуту")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than", type=int, default=60,
+            help="Считать потерянными задачи, ждущие дольше стольких секунд")
+
+    def handle(self, *args, **options):
+        done, failed = tasks.run_pending(older_than=options["older_than"])
+        self.stdout.write(
+            f"Выполнено задач: {done}, с ошибкой: {failed}")
@@ -0,0 +1,61 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.models import Comment, Follow, Group, Post, User
+from posts.seeding import Seeder
+
+
+class Command(BaseCommand):
+    help = ("Наполняет базу синтетическими пользователями, группами, "
+            "постами, комментариями и подписками для нагрузочных тестов")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10000)
+        parser.add_argument("--groups", type=int, default=100)
+        parser.add_argument("--posts", type=int, default=100000)
+        parser.add_argument("--comments", type=int, default=300000)
+        parser.add_argument("--follows", type=int, default=200000)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--days", type=int, default=365,
+                            help="За сколько дней распределить посты")
+        parser.add_argument("--prefix", default="seed",
+                            help="Префикс имён пользователей и групп")
+        parser.add_argument(
+            "--skew", type=float, default=3.0,
+            help="Перекос авторов и подписок: 1 — равномерно, больше — "
+                 "сильнее выделяются популярные авторы")
+        parser.add_argument(
+            "--burst-share", type=float, default=0.7,
+            help="Доля постов, попадающих во всплески активности")
+        parser.add_argument(
+            "--image-share", type=float, default=0.0,
+            help="Доля постов с картинкой")
+
+    def handle(self, *args, **options):
+        if options["skew"] < 1:
+            raise CommandError("--skew не может быть меньше 1")
+        for name in ("burst_share", "image_share"):
+            if not 0 <= options[name] <= 1:
+                raise CommandError(f"--{name.replace('_', '-')} должен "
+                                   "быть от 0 до 1")
+        if User.objects.filter(
+                username__startswith=f"{options['prefix']}_user_").exists():
+            raise CommandError(
+                f"Данные с префиксом {options['prefix']} уже есть, "
+                "выберите другой --prefix")
+        started = time.perf_counter()
+        seeder = Seeder(
+            seed=options["seed"], batch_size=options["batch_size"],
+            days=options["days"], prefix=options["prefix"],
+            skew=options["skew"], burst_share=options["burst_share"],
+            image_share=options["image_share"], log=self.stdout.write)
+        seeder.run(users=options["users"], groups=options["groups"],
+                   posts=options["posts"], comments=options["comments"],
+                   follows=options["follows"])
+        totals = ", ".join(
+            f"{model._meta.verbose_name_plural}: {model.objects.count()}"
+            for model in (User, Group, Post, Comment, Follow))
+        self.stdout.write(
+            f"Готово за {time.perf_counter() - started:.1f} с. {totals}")
@@ -0,0 +1,39 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = ("Копирует базу default в локальные реплики SQLite через "
+            "backup API: копия согласована, писать в default можно и "
+            "во время копирования")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "aliases", nargs="*",
+            help="Какие реплики обновить, по умолчанию DATABASE_REPLICAS")
+
+    def handle(self, *args, **options):
+        aliases = options["aliases"] or settings.DATABASE_REPLICAS
+        if not aliases:
+            raise CommandError("Не указаны реплики: задайте "
+                               "DATABASE_REPLICAS или передайте псевдонимы")
+        source = connections["default"]
+        for alias in aliases:
+            if alias == "default" or alias not in settings.DATABASES:
+                raise CommandError(f"Неизвестная реплика {alias}")
+            if {source.vendor, connections[alias].vendor} != {"sqlite"}:
+                raise CommandError("Копировать можно только SQLite")
+            started = time.perf_counter()
+            connections[alias].close()
+            source.ensure_connection()
+            target = sqlite3.connect(connections[alias].settings_dict["NAME"])
+            try:
+                source.connection.backup(target)
+            finally:
+                target.close()
+            self.stdout.write(f"{alias}: скопировано за "
+                              f"{time.perf_counter() - started:.1f} с")
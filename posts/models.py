@@ -1,4 +1,5 @@
 from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
 from django.db import models
 
 User = get_user_model()
@@ -26,12 +27,30 @@ class Post(models.Model):
                               related_name="posts")
     image = models.ImageField(upload_to='posts/', verbose_name="Изображение",
                               blank=True, null=True)
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+    # Готовая миниатюра для карточки, заполняется posts.thumbnails
+    thumbnail = models.CharField(max_length=255, blank=True, editable=False)
+    thumbnail_width = models.PositiveIntegerField(null=True, editable=False)
+    thumbnail_height = models.PositiveIntegerField(null=True, editable=False)
 
     def __str__(self):
         return self.text[:20]
 
+    @property
+    def thumbnail_url(self):
+        return default_storage.url(self.thumbnail) if self.thumbnail else ""
+
     class Meta:
         ordering = ("-pub_date",)
+        # Ленты сортируются по (pub_date, id) в обратном порядке: индекс
+        # по возрастанию читается с конца и отдаёт строки без сортировки.
+        indexes = (
+            models.Index(fields=("pub_date",), name="post_pub_date"),
+            models.Index(fields=("group", "pub_date"),
+                         name="post_group_pub_date"),
+            models.Index(fields=("author", "pub_date"),
+                         name="post_author_pub_date"),
+        )
 
 
 class Comment(models.Model):
@@ -44,9 +63,112 @@ class Comment(models.Model):
     text = models.TextField(verbose_name="Текст комментария", )
     created = models.DateTimeField("date published", auto_now_add=True)
 
+    class Meta:
+        indexes = (
+            models.Index(fields=("post", "created"),
+                         name="comment_post_created"),
+        )
+
 
 class Follow(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE,
                              related_name="follower")
     author = models.ForeignKey(User, on_delete=models.CASCADE,
                                related_name="following")
+
+    class Meta:
+        unique_together = (("user", "author"),)
+        indexes = (
+            models.Index(fields=("author", "user"),
+                         name="follow_author_user"),
+        )
+
+
+class Suggestion(models.Model):
+    """Рекомендация «на кого подписаться» (см. posts.suggestions)."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             related_name="suggestions")
+    candidate = models.ForeignKey(User, on_delete=models.CASCADE,
+                                  related_name="+")
+    # Сколько авторов из подписок пользователя подписаны на кандидата.
+    score = models.PositiveIntegerField()
+
+    class Meta:
+        unique_together = (("user", "candidate"),)
+        indexes = (
+            models.Index(fields=("user", "-score", "candidate"),
+                         name="suggestion_user_score"),
+        )
+
+
+class SuggestionRefresh(models.Model):
+    """Пользователь, чьи подписки менялись после расчёта рекомендаций."""
+    # Не внешний ключ: при удалении пользователя каскадное удаление
+    # подписок снова кладёт его в очередь, а пересчёт просто пропустит id.
+    user_id = models.IntegerField(primary_key=True)
+
+
+class PendingTask(models.Model):
+    """Фоновая задача (posts/tasks.py), ещё не выполненная до конца.
+
+    Строка пишется в одной транзакции с изменением, которое породило
+    задачу, и удаляется после её выполнения: задачи, потерянные вместе
+    с процессом, остаются здесь и выполняются командой run_pending_tasks.
+    """
+    func = models.CharField(max_length=200)
+    args = models.TextField()
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
+
+
+class TimelineEntry(models.Model):
+    """Запись ленты подписок: пост автора, разложенный подписчику."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             related_name="timeline")
+    post = models.ForeignKey(Post, on_delete=models.CASCADE,
+                             related_name="timeline_entries")
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        unique_together = (("user", "post"),)
+        indexes = (
+            models.Index(fields=("user", "pub_date", "post"),
+                         name="timeline_user_pub_date_post"),
+        )
+
+
+class TrendingState(models.Model):
+    """Точка отсчёта весов в PostTrend и GroupTrend, одна строка."""
+    epoch = models.DateTimeField()
+
+
+class PostTrend(models.Model):
+    """Затухающий вес поста по новым комментариям (см. posts.trending)."""
+    post = models.OneToOneField(Post, on_delete=models.CASCADE,
+                                primary_key=True, related_name="trend")
+    score = models.FloatField()
+
+    class Meta:
+        indexes = (
+            models.Index(fields=("-score",), name="post_trend_score"),
+        )
+
+
+class GroupTrend(models.Model):
+    """Затухающий вес группы по новым постам и комментариям в ней."""
+    group = models.OneToOneField(Group, on_delete=models.CASCADE,
+                                 primary_key=True, related_name="trend")
+    score = models.FloatField()
+
+    class Meta:
+        indexes = (
+            models.Index(fields=("-score",), name="group_trend_score"),
+        )
+
+
+class UserStats(models.Model):
+    """Денормализованные счётчики пользователя для карточки автора."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE,
+                                primary_key=True, related_name="stats")
+    posts_count = models.PositiveIntegerField(default=0)
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
@@ -0,0 +1,156 @@
+import hashlib
+from collections import namedtuple
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Max
+from django.http import HttpResponse
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import http_date, quote_etag
+
+from posts.cache_keys import NAMES, generations
+from posts.models import Comment, Group, Post, User
+from posts.routing import primary_reads
+
+# generations — сущности, от которых зависит страница (см. cache_keys),
+# posts — посты страницы, по ним считается Last-Modified.
+PageScope = namedtuple("PageScope", ("generations", "posts"))
+
+
+def index_scope():
+    return PageScope((("posts",), *NAMES), Post.objects.all())
+
+
+def group_scope(slug):
+    group_id = Group.objects.filter(slug=slug).values_list(
+        "pk", flat=True).first()
+    if group_id is None:
+        return None
+    return PageScope((("group", group_id), *NAMES),
+                     Post.objects.filter(group_id=group_id))
+
+
+def profile_scope(username):
+    author_id = User.objects.filter(username=username).values_list(
+        "pk", flat=True).first()
+    if author_id is None:
+        return None
+    # Карточка автора показывает и подписчиков, и его подписки.
+    return PageScope((("author", author_id), ("followers", author_id),
+                      ("follows", author_id), *NAMES),
+                     Post.objects.filter(author_id=author_id))
+
+
+def post_scope(username, post_id):
+    author_id = Post.objects.filter(
+        pk=post_id, author__username=username).values_list(
+        "author_id", flat=True).first()
+    if author_id is None:
+        return None
+    return PageScope(
+        (("post", post_id), ("author", author_id), ("followers", author_id),
+         ("follows", author_id), *NAMES),
+        Post.objects.filter(pk=post_id))
+
+
+def last_modified(posts):
+    """Время самого свежего поста или комментария в области страницы."""
+    newest = [
+        posts.aggregate(newest=Max("pub_date"))["newest"],
+        Comment.objects.filter(post__in=posts.values("pk")).aggregate(
+            newest=Max("created"))["newest"],
+    ]
+    newest = [value for value in newest if value is not None]
+    return int(max(newest).timestamp()) if newest else None
+
+
+def scope_etag(request, *scopes):
+    """ETag из адреса и поколений переданных областей кэша."""
+    source = ":".join(
+        [request.get_full_path()]
+        + [str(value) for value in generations(*scopes)])
+    return quote_etag(hashlib.md5(source.encode()).hexdigest())
+
+
+def newest_post(posts):
+    """Время самого свежего поста: Last-Modified для лент RSS/Atom."""
+    newest = posts.aggregate(newest=Max("pub_date"))["newest"]
+    return int(newest.timestamp()) if newest else None
+
+
+def _finalize(response, etag, modified, vary_on_cookie):
+    response["ETag"] = etag
+    if modified is not None:
+        response["Last-Modified"] = http_date(modified)
+    if vary_on_cookie:
+        patch_vary_headers(response, ("Cookie",))
+    patch_cache_control(response, max_age=0, must_revalidate=True)
+    return response
+
+
+def _cached(view, request, args, kwargs, scope, modified_func,
+            vary_on_cookie):
+    etag = scope_etag(request, *scope.generations)
+    if "HTTP_IF_NONE_MATCH" in request.META:
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return _finalize(not_modified, etag, None, vary_on_cookie)
+
+    cache_key = f"page:{etag}"
+    cached = cache.get(cache_key)
+    if cached is None:
+        # Запись живёт до следующего изменения, поэтому строим её по
+        # default, а не по возможно отстающей реплике.
+        with primary_reads():
+            response = view(request, *args, **kwargs)
+            if response.status_code != 200 or response.streaming:
+                return response
+            modified = modified_func(scope.posts)
+        cache.set(cache_key,
+                  (response.content, response["Content-Type"], modified),
+                  settings.PAGE_CACHE_TIMEOUT)
+    else:
+        content, content_type, modified = cached
+        response = HttpResponse(content, content_type=content_type)
+    response = get_conditional_response(
+        request, etag=etag, last_modified=modified, response=response)
+    return _finalize(response, etag, modified, vary_on_cookie)
+
+
+def anonymous_page_cache(scope_func):
+    """Кэширует страницу целиком для анонимных GET-запросов.
+
+    ETag строится из адреса и поколений сущностей страницы, поэтому
+    правка поста или новый комментарий сразу дают новый ключ.
+    На совпавший If-None-Match отвечаем 304 без рендеринга.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if (request.method not in ("GET", "HEAD")
+                    or request.user.is_authenticated):
+                return view(request, *args, **kwargs)
+            scope = scope_func(**kwargs)
+            if scope is None:
+                return view(request, *args, **kwargs)
+            return _cached(view, request, args, kwargs, scope,
+                           last_modified, vary_on_cookie=True)
+        return wrapper
+    return decorator
+
+
+def feed_cache(scope_func):
+    """То же для лент RSS/Atom: они одинаковы для всех пользователей,
+    а Last-Modified берётся по самому свежему посту."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            scope = scope_func(**kwargs)
+            if request.method not in ("GET", "HEAD") or scope is None:
+                return view(request, *args, **kwargs)
+            return _cached(view, request, args, kwargs, scope, newest_post,
+                           vary_on_cookie=False)
+        return wrapper
+    return decorator
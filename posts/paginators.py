@@ -0,0 +1,238 @@
+import base64
+import binascii
+import heapq
+import math
+from itertools import islice
+
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+def encode_cursor(pub_date, pk):
+    raw = f"{pub_date.isoformat()}|{pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    """Возвращает (pub_date, pk) или None для битого токена."""
+    if not token:
+        return None
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        value, pk = raw.rsplit("|", 1)
+        pub_date = parse_datetime(value)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if pub_date is None:
+        return None
+    return pub_date, pk
+
+
+class CursorPage:
+    """Страница курсорной пагинации с интерфейсом django Page."""
+
+    def __init__(self, object_list, paginator, number=None,
+                 has_previous=False, has_next=False):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.number = number
+        self._has_previous = has_previous
+        self._has_next = has_next
+
+    def __repr__(self):
+        return f"<CursorPage of {len(self)} objects>"
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self.has_previous() or self.has_next()
+
+    @property
+    def next_cursor(self):
+        if not self.has_next() or not len(self):
+            return None
+        return self.paginator.cursor_for(self.object_list[len(self) - 1])
+
+    @property
+    def previous_cursor(self):
+        if not self.has_previous() or not len(self):
+            return None
+        return self.paginator.cursor_for(self.object_list[0])
+
+
+class CursorPaginator:
+    """Пагинация по ключу (pub_date, id) без COUNT(*) и OFFSET.
+
+    Страницы адресуются непрозрачными токенами ?after= и ?before=,
+    старые ссылки вида ?page=N продолжают работать через OFFSET.
+    """
+
+    def __init__(self, object_list, per_page, ordering=("pub_date", "pk")):
+        # ordering — поля (дата, id), по которым листается список:
+        # лента подписок — по копиям полей поста в записях ленты,
+        # комментарии — по (created, id).
+        self.date_field, self.pk_field = ordering
+        self.object_list = object_list.order_by(
+            f"-{self.date_field}", f"-{self.pk_field}")
+        self.per_page = per_page
+
+    def cursor_for(self, obj):
+        return encode_cursor(getattr(obj, self.date_field),
+                             getattr(obj, self.pk_field))
+
+    def _cursor_filter(self, pub_date, pk, direction):
+        return (Q(**{f"{self.date_field}__{direction}": pub_date})
+                | Q(**{self.date_field: pub_date,
+                       f"{self.pk_field}__{direction}": pk}))
+
+    def get_page(self, params):
+        after = decode_cursor(params.get("after"))
+        if after is not None:
+            return self._page_after(after)
+        before = decode_cursor(params.get("before"))
+        if before is not None:
+            return self._page_before(before)
+        return self._page_number(params.get("page"))
+
+    def _rows_after(self, cursor, offset, limit):
+        """До limit объектов после курсора, начиная с offset-го."""
+        return list(self.queryset_after(cursor)[offset:offset + limit])
+
+    def _rows_before(self, cursor, limit):
+        """До limit объектов перед курсором, ближайшие первыми."""
+        pub_date, pk = cursor
+        return list(self.object_list.filter(
+            self._cursor_filter(pub_date, pk, "gt")).reverse()[:limit])
+
+    def count(self):
+        return self.object_list.count()
+
+    def _page_number(self, number):
+        try:
+            number = max(int(number), 1)
+        except (TypeError, ValueError):
+            number = 1
+        offset = (number - 1) * self.per_page
+        items = self._rows_after(None, offset, self.per_page + 1)
+        if not items and number > 1:
+            # Номер за концом списка (старая или подделанная ссылка):
+            # как Paginator.get_page, отдаём последнюю страницу.
+            number = max(math.ceil(self.count() / self.per_page), 1)
+            offset = (number - 1) * self.per_page
+            items = self._rows_after(None, offset, self.per_page)
+        return CursorPage(items[:self.per_page], self, number=number,
+                          has_previous=number > 1,
+                          has_next=len(items) > self.per_page)
+
+    def queryset_after(self, cursor):
+        """Объекты после курсора (или с начала) в порядке пагинации."""
+        if cursor is None:
+            return self.object_list
+        pub_date, pk = cursor
+        return self.object_list.filter(
+            self._cursor_filter(pub_date, pk, "lt"))
+
+    def _page_after(self, cursor):
+        items = self._rows_after(cursor, 0, self.per_page + 1)
+        # За курсором может не оказаться ничего: последний пост удалён
+        # или курсор подделан. Тогда и ссылки назад строить не от чего.
+        return CursorPage(items[:self.per_page], self,
+                          has_previous=bool(items),
+                          has_next=len(items) > self.per_page)
+
+    def _page_before(self, cursor):
+        items = self._rows_before(cursor, self.per_page + 1)
+        has_previous = len(items) > self.per_page
+        items = items[:self.per_page]
+        items.reverse()
+        return CursorPage(items, self, has_previous=has_previous,
+                          has_next=bool(items))
+
+
+class MergedCursorPaginator(CursorPaginator):
+    """Курсорная пагинация по нескольким спискам с одним порядком.
+
+    Каждый список читается своим индексом не дальше страницы от курсора,
+    прочитанное сливается в памяти (heapq.merge): базе не приходится
+    сортировать объединение списков целиком. Объект, попавший в
+    несколько списков, показывается один раз.
+    """
+
+    def __init__(self, sources, per_page, ordering=("pub_date", "pk")):
+        self.sources = [CursorPaginator(queryset, per_page, ordering)
+                        for queryset in sources]
+        first, *rest = [source.object_list for source in self.sources]
+        # Для стандартного Paginator в контексте шаблона; сама пагинация
+        # объединение не читает.
+        super().__init__(first.union(*rest, all=True), per_page, ordering)
+
+    def _key(self, obj):
+        return (getattr(obj, self.date_field), getattr(obj, self.pk_field))
+
+    def _merge(self, rows, reverse):
+        last = None
+        for obj in heapq.merge(*rows, key=self._key, reverse=reverse):
+            key = self._key(obj)
+            if key != last:
+                last = key
+                yield obj
+
+    def _rows_after(self, cursor, offset, limit):
+        rows = [source._rows_after(cursor, 0, offset + limit)
+                for source in self.sources]
+        return list(islice(self._merge(rows, reverse=True),
+                           offset, offset + limit))
+
+    def _rows_before(self, cursor, limit):
+        rows = [source._rows_before(cursor, limit)
+                for source in self.sources]
+        return list(islice(self._merge(rows, reverse=False), limit))
+
+    def count(self):
+        return sum(source.count() for source in self.sources)
+
+
+def loaded_queryset(queryset, objects):
+    """Копия queryset, уже «выполненная» со списком objects.
+
+    Так страницу можно отдать коду, который ждёт QuerySet, без второго
+    запроса: кэш результатов заполняется так же, как это делает
+    prefetch_related.
+    """
+    clone = queryset.all()
+    clone._result_cache = list(objects)
+    clone._prefetch_done = True
+    return clone
+
+
+def page_context(page):
+    """Контекст страницы ленты для шаблона.
+
+    items — курсорная страница, по ней строится навигация. page и
+    paginator — стандартные Page и Paginator с теми же объектами для
+    кода, который ждёт их; Paginator ленивый и выполнит COUNT(*), только
+    если спросить у него число объектов или страниц.
+    """
+    paginator = Paginator(page.paginator.object_list,
+                          page.paginator.per_page)
+    return {
+        "page": Page(page.object_list, page.number or 1, paginator),
+        "paginator": paginator,
+        "items": page,
+    }
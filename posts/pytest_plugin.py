@@ -0,0 +1,56 @@
+"""Плагин pytest для бюджетов запросов (см. posts/budgets.py).
+
+Включает строгий режим: тест, в котором страница выполнила больше
+SQL-запросов, чем в REQUEST_BUDGETS, падает с их списком; превышение
+времени только попадает в лог. Бюджет можно переопределить для теста
+маркером::
+
+    @pytest.mark.request_budget(index={"queries": 5})
+
+В конце прогона печатается максимум по каждому имени URL.
+"""
+import pytest
+
+_usage = {}
+
+
+def _record(sender, url_name, stats, **kwargs):
+    if url_name is None:
+        return
+    worst = _usage.setdefault(url_name, {})
+    for name, value in stats.measured().items():
+        worst[name] = max(worst.get(name, 0), value)
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        "markers",
+        "request_budget(**budgets): бюджеты запросов для имён URL в тесте")
+
+
+@pytest.fixture(autouse=True)
+def request_budgets(request, settings):
+    from posts.budgets import request_measured
+
+    settings.REQUEST_BUDGETS_STRICT = True
+    marker = request.node.get_closest_marker("request_budget")
+    if marker is not None:
+        settings.REQUEST_BUDGETS = {**settings.REQUEST_BUDGETS,
+                                    **marker.kwargs}
+    request_measured.connect(_record, dispatch_uid="pytest_request_budgets")
+    yield
+    request_measured.disconnect(dispatch_uid="pytest_request_budgets")
+
+
+def pytest_terminal_summary(terminalreporter):
+    if not _usage:
+        return
+    from django.conf import settings
+
+    terminalreporter.section("request budgets")
+    for url_name in sorted(_usage):
+        worst = _usage[url_name]
+        budget = settings.REQUEST_BUDGETS.get(url_name, {})
+        terminalreporter.write_line(f"{url_name:16} " + "  ".join(
+            f"{name}={worst[name]:.0f}/{budget.get(name, '-')}"
+            for name in ("queries", "db_ms", "render_ms")))
@@ -0,0 +1,43 @@
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from posts.models import Comment, Post
+
+
+def related_count(model, field):
+    """Коррелированный подзапрос с числом строк model, ссылающихся
+    через field на текущую строку."""
+    counts = (
+        model.objects.filter(**{field: OuterRef("pk")})
+        .order_by()
+        .values(field)
+        .annotate(total=Count("pk"))
+        .values("total")
+    )
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def comments_count():
+    return related_count(Comment, "post")
+
+
+def feed_queryset(queryset=None):
+    """Посты для карточек ленты: автор и группа загружаются тем же
+    запросом, что и сами посты, число комментариев хранится в строке."""
+    if queryset is None:
+        queryset = Post.objects.all()
+    return queryset.select_related("author", "group")
+
+
+def chunked_ids(queryset, chunk_size):
+    """Отдаёт первичные ключи queryset порциями по chunk_size."""
+    last_pk = 0
+    while True:
+        chunk = list(
+            queryset.filter(pk__gt=last_pk).order_by("pk")
+            .values_list("pk", flat=True)[:chunk_size]
+        )
+        if not chunk:
+            return
+        yield chunk
+        last_pk = chunk[-1]
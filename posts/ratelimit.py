@@ -0,0 +1,130 @@
+"""Ограничение частоты запросов счётчиками в общем кэше.
+
+RATE_LIMITS задаёт для имени URL пару (запросов, секунд): в каждом
+окне длиной столько секунд можно сделать столько запросов. Счётчик
+свой у каждого пользователя, у анонимов — у каждого IP. Запросы
+считаются только те, что что-то меняют: POST и прочие небезопасные
+методы и GET к routing.PIN_VIEWS (подписка и отписка); открыть форму
+можно сколько угодно раз.
+
+Окно — ключ кэша с номером окна в имени. Первый запрос в окне создаёт
+его атомарным cache.add(): это одно обращение к кэшу, и так проходит
+почти каждая запись обычного пользователя. Следующие запросы того же
+окна после неудачного add() увеличивают счётчик cache.incr() — второе
+обращение платят только те, кто пишет часто. Отклонённому запросу
+ничего возвращать не нужно: счётчик окна просто продолжает расти.
+
+На стыке окон клиент может успеть сделать до двух лимитов подряд —
+за это ограничитель и обходится одной атомарной операцией.
+"""
+import math
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpResponse
+
+from posts.routing import PIN_VIEWS
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS", "TRACE")
+
+
+def now_ms():
+    return int(time.time() * 1000)
+
+
+def bucket_key(request, name):
+    user = request.user
+    if user.is_authenticated:
+        return f"ratelimit:{name}:user:{user.pk}"
+    return f"ratelimit:{name}:ip:{request.META.get('REMOTE_ADDR')}"
+
+
+def take(key, requests, seconds):
+    """Засчитывает запрос в текущем окне счётчика key.
+
+    Возвращает 0, если запрос укладывается в лимит, иначе — через
+    сколько секунд начнётся следующее окно.
+    """
+    now = now_ms()
+    window_ms = seconds * 1000
+    window = now // window_ms
+    key = f"{key}:{window}"
+    if cache.add(key, 1, seconds):
+        return 0
+    try:
+        count = cache.incr(key)
+    except ValueError:
+        # Окно истекло между add() и incr(): запрос уже в следующем.
+        return 0
+    if count <= requests:
+        return 0
+    return math.ceil(((window + 1) * window_ms - now) / 1000)
+
+
+def too_many_requests(retry_after):
+    response = HttpResponse("Слишком много запросов, попробуйте позже",
+                            content_type="text/plain; charset=utf-8",
+                            status=429)
+    response["Retry-After"] = str(retry_after)
+    return response
+
+
+def get_limit(name):
+    """(запросов, секунд) для name или None, если лимита нет."""
+    limit = settings.RATE_LIMITS.get(name)
+    if limit is None:
+        return None
+    requests, seconds = limit
+    # С нулём запросов или окном короче секунды лимит не работал бы.
+    if requests < 1 or seconds < 1:
+        raise ImproperlyConfigured(
+            f"RATE_LIMITS[{name!r}]: нужно не меньше 1 запроса за окно "
+            f"не короче 1 с, задано {requests} за {seconds} с")
+    return limit
+
+
+def is_write(request, name):
+    return request.method not in SAFE_METHODS or name in PIN_VIEWS
+
+
+def check(request, name):
+    """Ответ 429, если запрос меняет данные и лимит для name исчерпан,
+    иначе None."""
+    if not is_write(request, name):
+        return None
+    limit = get_limit(name)
+    if limit is None:
+        return None
+    retry_after = take(bucket_key(request, name), *limit)
+    if retry_after:
+        return too_many_requests(retry_after)
+    return None
+
+
+def rate_limited(name):
+    """Декоратор: применяет к view лимит RATE_LIMITS[name]."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            return check(request, name) or view(request, *args, **kwargs)
+        wrapper.rate_limited = True
+        return wrapper
+    return decorator
+
+
+class RateLimitMiddleware:
+    """Применяет RATE_LIMITS по имени URL ко всем view без декоратора."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if getattr(view_func, "rate_limited", False):
+            return None
+        return check(request, request.resolver_match.view_name)
@@ -0,0 +1,87 @@
+"""Чтение с реплик базы для страниц, которые только читают.
+
+ReplicaMiddleware включает реплику на время запроса к одному из
+REPLICA_VIEWS, ReplicaRouter направляет туда чтения; запись всегда идёт
+в default. После изменений (POST или одна из PIN_VIEWS) пользователь
+получает куку и REPLICA_PIN_SECONDS читает только с default, чтобы
+видеть свои изменения, пока реплика догоняет.
+
+Общие кэши (страницы для анонимов, карточки постов) заполняются только
+по данным default: запись в них живёт до следующего изменения, и
+отстающая реплика закрепила бы в них старые данные.
+"""
+import random
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+
+PIN_COOKIE = "primary_reads"
+
+# Страницы, которые только читают базу.
+REPLICA_VIEWS = {"index", "group", "profile", "post", "post_comments",
+                 "follow_index"}
+# Изменения, выполняемые GET-запросом.
+PIN_VIEWS = {"profile_follow", "profile_unfollow"}
+
+_local = threading.local()
+
+
+def current_replica():
+    return getattr(_local, "alias", None)
+
+
+@contextmanager
+def primary_reads():
+    """Внутри блока все чтения идут в default."""
+    alias = current_replica()
+    _local.alias = None
+    try:
+        yield
+    finally:
+        _local.alias = alias
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return current_replica() or "default"
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики — копии default, объекты из них можно связывать.
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db == "default"
+
+
+class ReplicaMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            response = self.get_response(request)
+        finally:
+            _local.alias = None
+        match = request.resolver_match
+        if request.method not in ("GET", "HEAD", "OPTIONS") or (
+                match and match.view_name in PIN_VIEWS):
+            response.set_cookie(PIN_COOKIE, "1",
+                                max_age=settings.REPLICA_PIN_SECONDS,
+                                httponly=True)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (not settings.DATABASE_REPLICAS
+                or request.method not in ("GET", "HEAD")
+                or request.resolver_match.view_name not in REPLICA_VIEWS
+                or PIN_COOKIE in request.COOKIES):
+            return None
+        # Пользователь и сессия читаются с default: только что созданных
+        # на реплике может ещё не быть.
+        request.user.is_authenticated
+        _local.alias = random.choice(settings.DATABASE_REPLICAS)
+        return None
@@ -0,0 +1,103 @@
+import re
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models.expressions import RawSQL
+
+from posts.models import Post
+from posts.queries import chunked_ids
+
+FTS_TABLE = "posts_post_fts"
+
+MATCH_IDS_SQL = f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s"
+
+# Кандидаты берутся от новых к старым (rowid растёт вместе с id поста),
+# поэтому стоимость запроса ограничена SEARCH_MAX_CANDIDATES, а не
+# размером таблицы. Внутри набора порядок: bm25 плюс штраф за возраст.
+RANKED_IDS_SQL = f"""
+SELECT candidates.id
+FROM (
+    SELECT rowid AS id, bm25({FTS_TABLE}) AS relevance
+    FROM {FTS_TABLE}
+    WHERE {FTS_TABLE} MATCH %s
+    ORDER BY rowid DESC
+    LIMIT %s
+) AS candidates
+JOIN posts_post ON posts_post.id = candidates.id
+ORDER BY candidates.relevance
+    + (julianday('now') - julianday(posts_post.pub_date)) * %s
+"""
+
+
+def is_supported():
+    return connection.vendor == "sqlite"
+
+
+def to_match_query(text):
+    """Превращает пользовательский ввод в безопасный запрос FTS5:
+    каждое слово ищется по префиксу, все слова обязательны."""
+    words = re.findall(r"\w+", text)
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def index_post(post_id, text):
+    if not is_supported():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT OR REPLACE INTO {FTS_TABLE} (rowid, text) "
+            "VALUES (%s, %s)", [post_id, text])
+
+
+def unindex_post(post_id):
+    if not is_supported():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s",
+                       [post_id])
+
+
+def filter_posts(queryset, text):
+    """Ограничивает queryset постами, подходящими под запрос."""
+    match = to_match_query(text)
+    if not match:
+        return queryset.none()
+    if not is_supported():
+        return queryset.filter(text__icontains=text)
+    return queryset.filter(pk__in=RawSQL(MATCH_IDS_SQL, [match]))
+
+
+def ranked_post_ids(text):
+    """Id найденных постов в порядке релевантности."""
+    match = to_match_query(text)
+    if not match:
+        return []
+    if not is_supported():
+        return list(
+            Post.objects.filter(text__icontains=text)
+            .values_list("pk", flat=True)[:settings.SEARCH_MAX_CANDIDATES])
+    with connection.cursor() as cursor:
+        cursor.execute(RANKED_IDS_SQL, [
+            match,
+            settings.SEARCH_MAX_CANDIDATES,
+            settings.SEARCH_RECENCY_WEIGHT,
+        ])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def rebuild(batch_size=1000):
+    """Заново строит поисковый индекс порциями по batch_size постов.
+
+    Очистка и заполнение идут в одной транзакции: до её коммита поиск
+    видит старый индекс целиком, а не пустой или наполовину новый.
+    """
+    indexed = 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        for chunk in chunked_ids(Post.objects.all(), batch_size):
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, text) "
+                "SELECT id, text FROM posts_post WHERE id BETWEEN %s AND %s",
+                [chunk[0], chunk[-1]])
+            indexed += len(chunk)
+    return indexed
@@ -0,0 +1,233 @@
+import random
+import time
+from array import array
+from contextlib import contextmanager
+from datetime import timedelta
+from io import BytesIO
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image
+
+from posts import (cache_keys, counters, search, thumbnails, timelines,
+                   trending)
+from posts.models import Comment, Follow, Group, Post, User
+
+
+@contextmanager
+def manual_dates():
+    """Позволяет bulk_create сохранить заданные pub_date/created
+    вместо текущего времени из auto_now_add."""
+    fields = (Post._meta.get_field("pub_date"),
+              Comment._meta.get_field("created"))
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def _bulk_create(model, objects, batch_size, ignore_conflicts=False):
+    """Сохраняет поток объектов порциями, каждая в своей транзакции."""
+    batch = []
+    created = 0
+    for obj in objects:
+        batch.append(obj)
+        if len(batch) >= batch_size:
+            with transaction.atomic():
+                model.objects.bulk_create(
+                    batch, ignore_conflicts=ignore_conflicts)
+            created += len(batch)
+            batch = []
+    if batch:
+        with transaction.atomic():
+            model.objects.bulk_create(batch, ignore_conflicts=ignore_conflicts)
+        created += len(batch)
+    return created
+
+
+# Всплески активности: пост попадает в окрестность одного из моментов
+# всплеска с разбросом BURST_SECONDS; всплесков примерно раз в три дня.
+BURST_SECONDS = 3 * 3600
+BURST_EVERY_DAYS = 3
+IMAGE_VARIANTS = 8
+IMAGE_SIZE = (1280, 720)
+
+
+def _ids(queryset):
+    ids = array("q")
+    ids.extend(queryset.order_by("pk").values_list("pk", flat=True)
+               .iterator())
+    return ids
+
+
+class Seeder:
+    """Наполняет базу синтетическими данными для нагрузочных тестов.
+
+    Одинаковый seed даёт одинаковый набор данных. bulk_create не
+    вызывает сигналы, поэтому счётчики, ленты и поисковый индекс
+    пересобираются в finish().
+    """
+
+    def __init__(self, seed=0, batch_size=1000, days=365, prefix="seed",
+                 skew=1.0, burst_share=0.0, image_share=0.0, log=None):
+        self.random = random.Random(seed)
+        self.batch_size = batch_size
+        self.days = days
+        self.prefix = prefix
+        self.skew = skew
+        self.burst_share = burst_share
+        self.image_share = image_share
+        self.log = log or (lambda message: None)
+        self.now = timezone.now()
+        self.bursts = [
+            self.random.random() * days * 86400
+            for _ in range(max(days // BURST_EVERY_DAYS, 1))
+        ] if burst_share else []
+        self.images = []
+
+    def random_time(self):
+        span = self.days * 86400
+        if self.bursts and self.random.random() < self.burst_share:
+            center = self.random.choice(self.bursts)
+            seconds = center + self.random.gauss(0, BURST_SECONDS)
+            seconds = min(max(seconds, 0), span)
+        else:
+            seconds = self.random.random() * span
+        return self.now - timedelta(seconds=seconds)
+
+    def pick_author(self, user_ids):
+        # При skew > 1 первые пользователи получают непропорционально
+        # много постов и подписчиков — распределение с тяжёлым хвостом.
+        return user_ids[int(len(user_ids) * self.random.random() ** self.skew)]
+
+    def create_users(self, count):
+        password = make_password(None)
+        users = (
+            User(username=f"{self.prefix}_user_{number}", password=password)
+            for number in range(count)
+        )
+        _bulk_create(User, users, self.batch_size)
+        return _ids(User.objects.filter(
+            username__startswith=f"{self.prefix}_user_"))
+
+    def create_groups(self, count):
+        groups = (
+            Group(title=f"{self.prefix} group {number}",
+                  slug=f"{self.prefix}-group-{number}",
+                  description="Сгенерированная группа")
+            for number in range(count)
+        )
+        _bulk_create(Group, groups, self.batch_size)
+        return _ids(Group.objects.filter(
+            slug__startswith=f"{self.prefix}-group-"))
+
+    def create_images(self, count=IMAGE_VARIANTS):
+        """Сохраняет несколько картинок, общих для всех сгенерированных
+        постов, и сразу строит их миниатюры."""
+        images = []
+        for number in range(count):
+            color = tuple(self.random.randrange(256) for _ in range(3))
+            buffer = BytesIO()
+            Image.new("RGB", IMAGE_SIZE, color).save(buffer, "JPEG")
+            name = default_storage.save(f"posts/{self.prefix}_{number}.jpg",
+                                        ContentFile(buffer.getvalue()))
+            images.append((name, thumbnails.generate(name)))
+        return images
+
+    def post_objects(self, count, user_ids, group_ids):
+        for number in range(count):
+            post = Post(
+                text=f"Сгенерированный пост {number}",
+                author_id=self.pick_author(user_ids),
+                group_id=(self.random.choice(group_ids)
+                          if group_ids and self.random.random() < 0.5
+                          else None),
+                pub_date=self.random_time(),
+            )
+            if self.images and self.random.random() < self.image_share:
+                post.image, thumbnail = self.random.choice(self.images)
+                if thumbnail is not None:
+                    post.thumbnail = thumbnail.name
+                    post.thumbnail_width = thumbnail.width
+                    post.thumbnail_height = thumbnail.height
+            yield post
+
+    def create_posts(self, count, user_ids, group_ids):
+        last_pk = Post.objects.order_by("-pk").values_list(
+            "pk", flat=True).first() or 0
+        with manual_dates():
+            _bulk_create(Post, self.post_objects(count, user_ids, group_ids),
+                         self.batch_size)
+        return _ids(Post.objects.filter(pk__gt=last_pk))
+
+    def create_comments(self, count, user_ids, post_ids):
+        comments = (
+            Comment(post_id=self.random.choice(post_ids),
+                    author_id=self.random.choice(user_ids),
+                    text=f"Сгенерированный комментарий {number}",
+                    created=self.random_time())
+            for number in range(count)
+        )
+        with manual_dates():
+            return _bulk_create(Comment, comments, self.batch_size)
+
+    def follow_pairs(self, count, user_ids):
+        # Популярность у читателей не совпадает с активностью авторов,
+        # иначе ленты самых плодовитых авторов раздуваются квадратично.
+        popular = array("q", user_ids)
+        self.random.shuffle(popular)
+        for _ in range(count):
+            user_id = self.random.choice(user_ids)
+            author_id = self.pick_author(popular)
+            if user_id != author_id:
+                yield user_id, author_id
+
+    def create_follows(self, count, user_ids):
+        follows = (
+            Follow(user_id=user_id, author_id=author_id)
+            for user_id, author_id in self.follow_pairs(count, user_ids)
+        )
+        return _bulk_create(Follow, follows, self.batch_size,
+                            ignore_conflicts=True)
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        yield
+        self.log(f"{name}: {time.perf_counter() - started:.1f} с")
+
+    def finish(self):
+        with self.stage("счётчики"):
+            counters.repair_all(chunk_size=self.batch_size)
+        with self.stage("ленты подписок"):
+            timelines.rebuild(chunk_size=self.batch_size)
+        if search.is_supported():
+            with self.stage("поисковый индекс"):
+                search.rebuild(batch_size=self.batch_size)
+        with self.stage("популярное"):
+            trending.rebuild(batch_size=self.batch_size)
+        cache_keys.bump_site()
+
+    def run(self, users, groups, posts, comments, follows):
+        with self.stage("пользователи"):
+            user_ids = self.create_users(users)
+        with self.stage("группы"):
+            group_ids = self.create_groups(groups)
+        if self.image_share:
+            with self.stage("картинки"):
+                self.images = self.create_images()
+        with self.stage("посты"):
+            post_ids = self.create_posts(posts, user_ids, group_ids)
+        if post_ids:
+            with self.stage("комментарии"):
+                self.create_comments(comments, user_ids, post_ids)
+        if len(user_ids) > 1:
+            with self.stage("подписки"):
+                self.create_follows(follows, user_ids)
+        self.finish()
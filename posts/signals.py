@@ -0,0 +1,97 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from posts import auth, counters, search, suggestions, timelines, trending
+from posts.cache_keys import bump, bump_post
+from posts.models import Comment, Follow, Group, Post, User
+from posts.tasks import enqueue
+
+
+@receiver(pre_save, sender=Post)
+def post_saving(sender, instance, **kwargs):
+    # Запоминаем прежнюю группу, чтобы сбросить и её кэш при переносе поста.
+    instance._previous_group_id = None
+    if not instance._state.adding:
+        instance._previous_group_id = Post.objects.filter(
+            pk=instance.pk).values_list("group_id", flat=True).first()
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    search.index_post(instance.pk, instance.text)
+    bump_post(instance.pk, instance.author_id, instance.group_id,
+              getattr(instance, "_previous_group_id", None))
+    if created:
+        counters.bump_user(instance.author_id, "posts_count", 1)
+        enqueue(timelines.fan_out_post, instance.pk)
+        trending.record_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    search.unindex_post(instance.pk)
+    bump_post(instance.pk, instance.author_id, instance.group_id)
+    counters.bump_user(instance.author_id, "posts_count", -1)
+
+
+def comment_changed(comment, delta):
+    counters.bump_comments(comment.post_id, delta)
+    post = Post.objects.filter(pk=comment.post_id).values(
+        "author_id", "group_id").first()
+    if post is not None:
+        bump_post(comment.post_id, post["author_id"],
+                  post["group_id"])
+    return post
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    if created:
+        post = comment_changed(instance, 1)
+        if post is not None:
+            trending.record_comment(instance, post["group_id"])
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    post = comment_changed(instance, -1)
+    if post is not None:
+        trending.forget_comment(instance, post["group_id"])
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, **kwargs):
+    if created:
+        bump(("follows", instance.user_id),
+             ("followers", instance.author_id))
+        counters.bump_user(instance.author_id, "followers_count", 1)
+        counters.bump_user(instance.user_id, "following_count", 1)
+        enqueue(timelines.backfill, instance.user_id, instance.author_id)
+        suggestions.followed(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    bump(("follows", instance.user_id),
+         ("followers", instance.author_id))
+    counters.bump_user(instance.author_id, "followers_count", -1)
+    counters.bump_user(instance.user_id, "following_count", -1)
+    enqueue(timelines.prune, instance.user_id, instance.author_id)
+    suggestions.mark_changed(instance.user_id)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    auth.invalidate(instance.pk)
+    # Имя видно на закэшированных страницах (cache_keys.NAMES); вход
+    # обновляет только last_login и их не меняет.
+    if kwargs.get("update_fields") != {"last_login"}:
+        bump(("users",))
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    # Название и описание группы видны на её странице и в карточках.
+    bump(("group", instance.pk), ("group_meta", instance.pk), ("groups",))
@@ -0,0 +1,82 @@
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from posts.budgets import unmeasured
+from posts.models import PendingTask
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.POSTS_TASK_WORKERS,
+            thread_name_prefix="posts-tasks",
+        )
+    return _executor
+
+
+def _run(task_id, func, args):
+    close_old_connections()
+    try:
+        func(*args)
+        PendingTask.objects.filter(pk=task_id).delete()
+    finally:
+        close_old_connections()
+
+
+def enqueue(func, *args):
+    """Выполняет func(*args) в фоновом пуле после коммита транзакции.
+
+    Задача сначала записывается в PendingTask в текущей транзакции и
+    удаляется, когда выполнена: если процесс остановится раньше, её
+    выполнит run_pending(). Поэтому задачи должны быть идемпотентными,
+    а аргументы — сериализуемыми в JSON.
+
+    При POSTS_TASKS_EAGER = True задача выполняется сразу, в том же
+    потоке, что удобно для тестов и отладки; в бюджет запроса
+    (posts/budgets.py) такая задача не входит.
+    """
+    if settings.POSTS_TASKS_EAGER:
+        with unmeasured():
+            func(*args)
+        return
+    task = PendingTask.objects.create(
+        func=f"{func.__module__}.{func.__qualname__}",
+        args=json.dumps(args))
+    transaction.on_commit(
+        lambda: _get_executor().submit(_run, task.pk, func, args))
+
+
+def run_pending(older_than=60):
+    """Выполняет задачи, которые ждут дольше older_than секунд: их пул
+    остановился, не успев их закончить. Неудачная задача остаётся в
+    очереди до следующего запуска.
+
+    Возвращает (выполнено, с ошибкой).
+    """
+    cutoff = timezone.now() - timedelta(seconds=older_than)
+    done = failed = 0
+    stale = PendingTask.objects.filter(created__lt=cutoff).order_by("pk")
+    for task in stale.iterator():
+        try:
+            func = import_string(task.func)
+            with transaction.atomic():
+                func(*json.loads(task.args))
+        except Exception:
+            logger.exception("Фоновая задача %s не выполнена", task.func)
+            failed += 1
+            continue
+        task.delete()
+        done += 1
+    return done, failed
@@ -0,0 +1,17 @@
+from django import template
+
+register = template.Library()
+
+# Параметры, которые выбирают страницу; остальные (например, q поиска)
+# ссылки навигации сохраняют.
+PAGE_PARAMS = ("after", "before", "page")
+
+
+@register.simple_tag(takes_context=True)
+def page_url(context, name, value):
+    """Строка запроса для соседней страницы того же списка."""
+    params = context["request"].GET.copy()
+    for param in PAGE_PARAMS:
+        params.pop(param, None)
+    params[name] = value
+    return "?" + params.urlencode()
@@ -0,0 +1,46 @@
+from django import template
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.templatetags.cache import CacheNode
+from django.utils.safestring import mark_safe
+
+from posts.cards import render_cards
+from posts.routing import current_replica
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def post_cards(context, posts):
+    """Карточки постов из кэша, см. posts/cards.py."""
+    return mark_safe("".join(render_cards(posts, context.get("user"))))
+
+
+class FeedCacheNode(CacheNode):
+    def render(self, context):
+        if current_replica() is None:
+            return super().render(context)
+        # Страница прочитана с реплики: ключ уже с новыми поколениями, и
+        # отстающая реплика закрепила бы под ним старую ленту. Готовый
+        # фрагмент берём, но новый не сохраняем.
+        vary_on = [var.resolve(context) for var in self.vary_on]
+        value = cache.get(make_template_fragment_key(self.fragment_name,
+                                                     vary_on))
+        if value is None:
+            value = self.nodelist.render(context)
+        return value
+
+
+@register.tag("feed_cache")
+def do_feed_cache(parser, token):
+    """{% feed_cache время имя ключ... %} — как {% cache %}, но фрагмент
+    сохраняется, только если страница прочитана с default."""
+    nodelist = parser.parse(("endfeed_cache",))
+    parser.delete_first_token()
+    tag, expire_time, fragment_name, *vary_on = token.split_contents()
+    if not vary_on:
+        raise template.TemplateSyntaxError(f"{tag}: нужен ключ фрагмента")
+    return FeedCacheNode(nodelist, parser.compile_filter(expire_time),
+                         fragment_name,
+                         [parser.compile_filter(var) for var in vary_on],
+                         None)
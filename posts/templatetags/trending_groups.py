@@ -0,0 +1,12 @@
+from django import template
+
+from posts import trending
+
+register = template.Library()
+
+
+@register.inclusion_tag("posts/includes/trending_groups.html")
+def trending_groups():
+    """Боковая колонка с популярными сообществами; список берётся из кэша
+    trending.top_groups(), поэтому вне фрагментов ленты."""
+    return {"groups": trending.top_groups()}
@@ -1,10 +1,43 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import Future, TimeoutError
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
 from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.core.exceptions import ImproperlyConfigured
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import (DatabaseError, IntegrityError, connection,
+                       connections, transaction)
 from django.shortcuts import get_object_or_404
-from django.test import Client, TestCase
+from django.template.backends.django import Template
+from django.http import HttpResponse
+from django.test import (Client, RequestFactory, TestCase,
+                         TransactionTestCase, override_settings)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 
-from posts.models import Comment, Follow, Group, Post, User
+from posts.budgets import BudgetExceeded
+from posts.models import (Comment, Follow, Group, GroupTrend, PendingTask,
+                          Post, PostTrend, SuggestionRefresh, TimelineEntry,
+                          TrendingState, User, UserStats)
+from posts import (auth, budgets, cache_keys, cards, ratelimit, routing,
+                   search, suggestions, tasks, transfer, trending, writes)
+from posts.paginators import encode_cursor
+from posts.queries import feed_queryset
+from posts.seeding import Seeder
+from users.forms import CreationForm, reserved_usernames
+from yatube.sqlite_cache import SQLiteCache
 
 
 class UsersTest(TestCase):
@@ -235,3 +268,1344 @@ class Project06Test(TestCase):
         self.assertEqual(add_comment.status_code, 302)
         comment = Comment.objects.count()
         self.assertEqual(comment, 0)
+
+
+class TimelineTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.reader = User.objects.create_user(username="reader")
+        self.author = User.objects.create_user(username="author")
+        self.client.force_login(self.reader)
+        self.old_post = Post.objects.create(text="old post",
+                                            author=self.author)
+        cache.clear()
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        self.client.get(reverse("profile_follow", args=[self.author]))
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=self.old_post).exists())
+        self.client.get(reverse("profile_unfollow", args=[self.author]))
+        self.assertFalse(TimelineEntry.objects.filter(
+            user=self.reader).exists())
+
+    def test_new_post_fans_out_to_followers(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        new_post = Post.objects.create(text="fresh post", author=self.author)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=new_post).exists())
+        response = self.client.get(reverse("follow_index"))
+        self.assertContains(response, "fresh post")
+        self.assertContains(response, "old post")
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_crossing_the_fanout_limit_moves_timelines(self):
+        other = User.objects.create_user(username="other")
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=self.old_post).exists())
+        follow = Follow.objects.create(user=other, author=self.author)
+        self.assertFalse(TimelineEntry.objects.exists())
+        pulled = Post.objects.create(text="pulled post", author=self.author)
+        follow.delete()
+        self.assertEqual(
+            set(TimelineEntry.objects.filter(user=self.reader).values_list(
+                "post_id", flat=True)),
+            {self.old_post.pk, pulled.pk})
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_pull_authors_are_merged_on_read(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        Post.objects.create(text="celebrity post", author=self.author)
+        self.assertFalse(TimelineEntry.objects.exists())
+        response = self.client.get(reverse("follow_index"))
+        self.assertContains(response, "celebrity post")
+        self.assertContains(response, "old post")
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_pages_merge_pushed_and_pulled_posts(self):
+        celebrity = User.objects.create_user(username="celebrity")
+        other = User.objects.create_user(username="other")
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.reader, author=celebrity)
+        Follow.objects.create(user=other, author=celebrity)
+        for number in range(8):
+            Post.objects.create(text=f"merged {number}",
+                                author=celebrity if number % 3 else
+                                self.author)
+        expected = list(Post.objects.filter(
+            author__in=[self.author, celebrity]).values_list("pk", flat=True))
+        seen, params = [], {}
+        while True:
+            page = self.client.get(reverse("follow_index"),
+                                   params).context["items"]
+            seen.extend(post.pk for post in page)
+            if not page.has_next():
+                break
+            params = {"after": page.next_cursor}
+        self.assertEqual(seen, expected)
+        back = self.client.get(reverse("follow_index"),
+                               {"before": page.previous_cursor})
+        self.assertEqual([post.pk for post in back.context["items"]],
+                         expected[:6])
+
+
+@override_settings(POSTS_TASKS_EAGER=False)
+class TimelineTaskTest(TransactionTestCase):
+    """Фоновые задачи выполняются позже коммита: лента, закэшированная
+    до них, не должна пережить их запись."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.reader = User.objects.create_user(username="reader")
+        self.author = User.objects.create_user(username="author")
+        self.client.force_login(self.reader)
+        self.tasks = []
+        patcher = mock.patch(
+            "posts.signals.enqueue",
+            lambda func, *args: self.tasks.append((func, args)))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def run_tasks(self):
+        while self.tasks:
+            func, args = self.tasks.pop(0)
+            func(*args)
+
+    def feed(self):
+        return self.client.get(reverse("follow_index"))
+
+    def test_backfill_and_fan_out_refresh_the_cached_feed(self):
+        Post.objects.create(text="old post", author=self.author)
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertNotContains(self.feed(), "old post")
+        self.run_tasks()
+        self.assertContains(self.feed(), "old post")
+
+        Post.objects.create(text="fresh post", author=self.author)
+        self.assertNotContains(self.feed(), "fresh post")
+        self.run_tasks()
+        self.assertContains(self.feed(), "fresh post")
+
+        Follow.objects.filter(user=self.reader).delete()
+        self.feed()
+        self.run_tasks()
+        self.assertNotContains(self.feed(), "old post")
+
+
+@override_settings(POSTS_TASKS_EAGER=False)
+class PendingTaskTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.reader = User.objects.create_user(username="reader")
+        self.author = User.objects.create_user(username="author")
+        Follow.objects.create(user=self.reader, author=self.author)
+
+    def pool(self, run):
+        executor = mock.Mock()
+        if run:
+            executor.submit.side_effect = lambda func, *args: func(*args)
+        return mock.patch.object(tasks, "_get_executor",
+                                 return_value=executor)
+
+    def test_finished_tasks_leave_the_queue(self):
+        with self.pool(run=True):
+            post = Post.objects.create(text="text", author=self.author)
+        self.assertTrue(TimelineEntry.objects.filter(post=post).exists())
+        self.assertFalse(PendingTask.objects.exists())
+
+    def test_lost_tasks_are_run_later(self):
+        with self.pool(run=False):
+            post = Post.objects.create(text="text", author=self.author)
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        self.assertEqual(tasks.run_pending(older_than=60), (0, 0))
+        self.assertEqual(tasks.run_pending(older_than=0), (1, 0))
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=post).exists())
+        self.assertFalse(PendingTask.objects.exists())
+
+
+class CursorPaginatorTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username="writer")
+        for number in range(25):
+            Post.objects.create(text=f"post number {number}",
+                                author=self.user)
+        cache.clear()
+
+    def walk(self, params):
+        response = self.client.get(reverse("index"), params)
+        return response.context["items"]
+
+    def test_after_and_before_cursors(self):
+        first = self.walk({})
+        self.assertEqual(len(first), 10)
+        self.assertFalse(first.has_previous())
+        second = self.walk({"after": first.next_cursor})
+        self.assertEqual(second[0].pk, first[9].pk - 1)
+        third = self.walk({"after": second.next_cursor})
+        self.assertEqual(len(third), 5)
+        self.assertFalse(third.has_next())
+        back = self.walk({"before": third.previous_cursor})
+        self.assertEqual([p.pk for p in back], [p.pk for p in second])
+        back = self.walk({"before": back.previous_cursor})
+        self.assertEqual([p.pk for p in back], [p.pk for p in first])
+        self.assertFalse(back.has_previous())
+
+    def test_legacy_page_links_and_bad_cursor(self):
+        page = self.walk({"page": 2})
+        self.assertEqual(page[0].text, "post number 14")
+        self.assertTrue(page.has_previous())
+        page = self.walk({"after": "not-a-cursor"})
+        self.assertEqual(page[0].text, "post number 24")
+
+    def test_out_of_range_page_shows_the_last_page(self):
+        response = self.client.get(reverse("index"), {"page": 99999})
+        self.assertEqual(response.status_code, 200)
+        page = response.context["items"]
+        self.assertEqual([p.text for p in page],
+                         [f"post number {n}" for n in range(4, -1, -1)])
+        self.assertEqual(page.number, 3)
+
+    def test_cursors_past_either_end(self):
+        old = encode_cursor(timezone.now() - timedelta(days=365), 0)
+        new = encode_cursor(timezone.now() + timedelta(days=365), 10 ** 9)
+        for url in (reverse("index"), reverse("profile", args=["writer"])):
+            for params in ({"after": old}, {"before": new}):
+                response = self.client.get(url, params)
+                self.assertEqual(response.status_code, 200)
+                page = response.context["items"]
+                self.assertEqual(len(page), 0)
+                self.assertIsNone(page.next_cursor)
+                self.assertIsNone(page.previous_cursor)
+
+    def test_links_keep_other_query_parameters(self):
+        response = self.client.get(reverse("index"),
+                                   {"q": "post", "page": 2})
+        cursor = response.context["items"].next_cursor
+        self.assertContains(response, f'href="?q=post&amp;after={cursor}"')
+        self.assertNotContains(response, "page=2")
+
+
+class FeedQueriesTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username="writer")
+        self.group = Group.objects.create(title="Group", slug="group")
+        cache.clear()
+
+    def add_posts(self, count):
+        for number in range(count):
+            post = Post.objects.create(text=f"post {number}",
+                                       author=self.user, group=self.group)
+            Comment.objects.create(post=post, author=self.user, text="hi")
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context)
+
+    def test_query_count_does_not_depend_on_page_size(self):
+        urls = (
+            reverse("index"),
+            reverse("group", args=[self.group.slug]),
+            reverse("profile", args=[self.user.username]),
+        )
+        self.add_posts(1)
+        few = [self.count_queries(url) for url in urls]
+        self.add_posts(9)
+        many = [self.count_queries(url) for url in urls]
+        self.assertEqual(few, many)
+
+    def test_comment_count_is_rendered(self):
+        self.add_posts(1)
+        response = self.client.get(reverse("index"))
+        self.assertContains(response, "1 комментариев")
+
+
+class CountersTest(TestCase):
+    def setUp(self):
+        self.reader = User.objects.create_user(username="reader")
+        self.author = User.objects.create_user(username="author")
+        self.post = Post.objects.create(text="text", author=self.author)
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.comment = Comment.objects.create(post=self.post,
+                                              author=self.reader, text="hi")
+
+    def test_counters_follow_writes(self):
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+        self.assertEqual(self.author.stats.posts_count, 1)
+        self.assertEqual(self.author.stats.followers_count, 1)
+        self.assertEqual(self.reader.stats.following_count, 1)
+        self.comment.delete()
+        Follow.objects.filter(user=self.reader).delete()
+        self.post.refresh_from_db()
+        self.author.stats.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 0)
+        self.assertEqual(self.author.stats.followers_count, 0)
+
+    def test_repair_counters_command(self):
+        Post.objects.update(comment_count=7)
+        UserStats.objects.update(posts_count=0, followers_count=5)
+        call_command("repair_counters", chunk_size=1, stdout=StringIO())
+        self.post.refresh_from_db()
+        self.author.stats.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+        self.assertEqual(self.author.stats.posts_count, 1)
+        self.assertEqual(self.author.stats.followers_count, 1)
+
+
+class FragmentCacheTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.reader = User.objects.create_user(username="reader")
+        self.author = User.objects.create_user(username="author")
+        self.other = User.objects.create_user(username="other")
+        self.client.force_login(self.reader)
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.post = Post.objects.create(text="followed post",
+                                        author=self.author)
+        Post.objects.create(text="unfollowed post", author=self.other)
+
+    def test_fragment_is_reused_until_generation_changes(self):
+        self.client.get(reverse("index"))
+        Post.objects.filter(pk=self.post.pk).update(text="silent edit")
+        response = self.client.get(reverse("index"))
+        self.assertContains(response, "followed post")
+        Comment.objects.create(post=self.post, author=self.reader, text="hi")
+        response = self.client.get(reverse("index"))
+        self.assertContains(response, "silent edit")
+
+    def test_feeds_do_not_share_entries(self):
+        self.client.get(reverse("index"))
+        response = self.client.get(reverse("follow_index"))
+        self.assertNotContains(response, "unfollowed post")
+        self.assertContains(response, "followed post")
+
+    def test_new_post_invalidates_author_and_group_pages(self):
+        group = Group.objects.create(title="Group", slug="group")
+        self.client.get(reverse("profile", args=[self.author.username]))
+        self.client.get(reverse("group", args=[group.slug]))
+        Post.objects.create(text="brand new", author=self.author,
+                            group=group)
+        for url in (reverse("profile", args=[self.author.username]),
+                    reverse("group", args=[group.slug])):
+            with self.subTest(url=url):
+                self.assertContains(self.client.get(url), "brand new")
+
+
+class SQLiteCacheTest(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.location = os.path.join(directory, "cache.sqlite3")
+        self.cache = SQLiteCache(self.location,
+                                 {"OPTIONS": {"MAX_ENTRIES": 3}})
+
+    def test_basic_operations(self):
+        self.cache.set("text", {"a": 1})
+        self.assertEqual(self.cache.get("text"), {"a": 1})
+        self.assertFalse(self.cache.add("text", "other"))
+        self.assertTrue(self.cache.add("new", "value"))
+        self.cache.set("gone", 1, timeout=0)
+        self.assertIsNone(self.cache.get("gone"))
+        self.assertEqual(self.cache.get_many(["text", "new", "missing"]),
+                         {"text": {"a": 1}, "new": "value"})
+        self.cache.delete("text")
+        self.assertFalse(self.cache.has_key("text"))
+
+    def test_incr_is_shared_between_instances(self):
+        other = SQLiteCache(self.location, {})
+        self.cache.set("counter", 10)
+        self.assertEqual(other.incr("counter", 5), 15)
+        self.assertEqual(self.cache.decr("counter"), 14)
+        with self.assertRaises(ValueError):
+            self.cache.incr("missing")
+
+    def test_least_recently_used_entries_are_culled(self):
+        for number in range(3):
+            self.cache.set(f"key{number}", number)
+        self.cache._connection().execute(
+            "UPDATE cache_entries SET accessed = accessed - 10 "
+            "WHERE key != ?", (self.cache.make_key("key0"),))
+        self.cache.set("key3", 3)
+        self.cache.set("key4", 4)
+        self.assertEqual(self.cache.get("key0"), 0)
+        self.assertIsNone(self.cache.get("key1"))
+
+    def test_tests_do_not_use_the_shared_cache_file(self):
+        shared = os.path.join(settings.BASE_DIR, "cache.sqlite3")
+        self.assertNotEqual(cache._path, shared)
+        self.assertTrue(cache._path.startswith(tempfile.gettempdir()))
+
+
+class AnonymousPageCacheTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.author = User.objects.create_user(username="author")
+        self.post = Post.objects.create(text="cached text",
+                                        author=self.author)
+        self.url = reverse("post", args=[self.author.username, self.post.pk])
+
+    def test_etag_revalidation_and_purge(self):
+        response = self.client.get(self.url)
+        etag = response["ETag"]
+        self.assertIn("Last-Modified", response)
+        not_modified = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(not_modified.status_code, 304)
+        Comment.objects.create(post=self.post, author=self.author,
+                               text="fresh comment")
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "fresh comment")
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_cached_page_is_served_without_rendering(self):
+        self.client.get(reverse("index"))
+        Post.objects.filter(pk=self.post.pk).update(text="silent edit")
+        response = self.client.get(reverse("index"))
+        self.assertContains(response, "cached text")
+        self.assertIsNone(response.context)
+
+    def test_bulk_loads_reset_cached_pages(self):
+        self.client.get(reverse("index"))
+        Post.objects.filter(pk=self.post.pk).update(text="imported text")
+        Seeder(seed=0).finish()
+        self.assertContains(self.client.get(reverse("index")),
+                            "imported text")
+
+    def assert_revalidates(self, url, change, text):
+        etag = self.client.get(url)["ETag"]
+        change()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, text)
+
+    def test_author_card_and_names_are_part_of_the_scope(self):
+        group = Group.objects.create(title="old title", slug="group")
+        Post.objects.filter(pk=self.post.pk).update(group=group)
+        cache_keys.bump_now(("post", self.post.pk))
+        profile = reverse("profile", args=[self.author.username])
+        other = User.objects.create_user(username="other")
+
+        self.assert_revalidates(
+            profile, lambda: Follow.objects.create(user=self.author,
+                                                   author=other),
+            "Подписан: 1")
+
+        def rename_author():
+            self.author.first_name = "Renamed"
+            self.author.save()
+
+        def rename_group():
+            group.title = "new title"
+            group.save()
+
+        for url in (profile, self.url):
+            self.assert_revalidates(url, rename_author, "Renamed")
+            self.author.first_name = ""
+            self.author.save()
+        for url in (profile, self.url, reverse("index")):
+            self.assert_revalidates(url, rename_group, "new title")
+            group.title = "old title"
+            group.save()
+
+    def test_login_does_not_reset_cached_pages(self):
+        before = cache_keys.generations(("users",))
+        self.author.save(update_fields=["last_login"])
+        self.assertEqual(cache_keys.generations(("users",)), before)
+
+    def test_logged_in_users_bypass_the_cache(self):
+        self.client.get(reverse("profile", args=[self.author.username]))
+        Post.objects.filter(pk=self.post.pk).update(text="silent edit")
+        self.client.force_login(self.author)
+        # Сдвигаем только поколение поста: страница профиля в кэше для
+        # анонимов остаётся прежней, а вошедший видит правку.
+        cache_keys.bump_now(("post", self.post.pk))
+        response = self.client.get(reverse("profile",
+                                           args=[self.author.username]))
+        self.assertContains(response, "silent edit")
+        self.assertNotIn("ETag", response)
+
+
+class EagerThumbnailTest(TestCase):
+    small_gif = (
+        b'\x47\x49\x46\x38\x39\x61\x01\x00\x01\x00\x00\x00\x00\x21\xf9\x04'
+        b'\x01\x0a\x00\x01\x00\x2c\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02'
+        b'\x02\x4c\x01\x00\x3b'
+    )
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        settings_override = override_settings(MEDIA_ROOT=media)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client = Client()
+        self.user = User.objects.create_user(username="uploader")
+        self.client.force_login(self.user)
+        cache.clear()
+
+    def image(self):
+        return SimpleUploadedFile(name="pic.gif", content=self.small_gif,
+                                  content_type="image/gif")
+
+    def test_upload_builds_thumbnail(self):
+        self.client.post(reverse("new_post"),
+                         {"text": "with picture", "image": self.image()})
+        post = Post.objects.get(text="with picture")
+        self.assertTrue(post.thumbnail)
+        self.assertEqual(post.thumbnail_width, 960)
+        response = self.client.get(
+            reverse("post", args=[self.user.username, post.pk]))
+        self.assertContains(response, post.thumbnail_url)
+
+    def test_original_is_shown_until_thumbnail_is_ready(self):
+        post = Post.objects.create(text="text", author=self.user,
+                                   image=self.image())
+        self.assertEqual(post.thumbnail, "")
+        response = self.client.get(
+            reverse("post", args=[self.user.username, post.pk]))
+        self.assertContains(response, post.image.url)
+
+    def test_new_image_resets_thumbnail(self):
+        self.client.post(reverse("new_post"),
+                         {"text": "with picture", "image": self.image()})
+        post = Post.objects.get(text="with picture")
+        old_thumbnail = post.thumbnail
+        image = self.image()
+        image.name = "other.gif"
+        self.client.post(reverse("post_edit", args=[self.user, post.pk]),
+                         {"text": "edited", "image": image})
+        post.refresh_from_db()
+        self.assertTrue(post.thumbnail)
+        self.assertNotEqual(post.thumbnail, old_thumbnail)
+
+
+class SearchTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username="writer")
+        self.post = Post.objects.create(text="Котики захватили Яндекс",
+                                        author=self.user)
+        Post.objects.create(text="Про собак", author=self.user)
+        cache.clear()
+
+    def search(self, query):
+        response = self.client.get(reverse("search"), {"q": query})
+        return [post.text for post in response.context["page"]]
+
+    def test_index_follows_writes(self):
+        self.assertEqual(self.search("котик"), [self.post.text])
+        self.post.text = "Теперь про хомяков"
+        self.post.save()
+        self.assertEqual(self.search("котик"), [])
+        self.assertEqual(self.search("хомяков"), [self.post.text])
+        self.post.delete()
+        self.assertEqual(self.search("хомяков"), [])
+
+    def test_operator_characters_are_ignored(self):
+        self.assertEqual(self.search('"котики" -(^'), [self.post.text])
+        self.assertEqual(self.search("***"), [])
+
+    def test_rebuild_command(self):
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM posts_post_fts")
+        self.assertEqual(self.search("собак"), [])
+        call_command("rebuild_search_index", batch_size=1, stdout=StringIO())
+        self.assertEqual(self.search("собак"), ["Про собак"])
+
+    def test_failed_rebuild_keeps_the_old_index(self):
+        def chunks(queryset, size):
+            yield [self.post.pk]
+            raise DatabaseError("boom")
+
+        with mock.patch("posts.search.chunked_ids", chunks), \
+                self.assertRaises(DatabaseError):
+            search.rebuild(batch_size=1)
+        self.assertEqual(self.search("собак"), ["Про собак"])
+
+
+class SeederTest(TestCase):
+    def test_seeded_data_matches_signal_driven_state(self):
+        Seeder(seed=1, batch_size=7).run(
+            users=10, groups=2, posts=60, comments=40, follows=30)
+        self.assertEqual(Post.objects.count(), 60)
+        self.assertEqual(Comment.objects.count(), 40)
+        for stats in UserStats.objects.all():
+            self.assertEqual(stats.posts_count,
+                             Post.objects.filter(author=stats.user).count())
+            self.assertEqual(stats.followers_count,
+                             Follow.objects.filter(author=stats.user).count())
+        follow = Follow.objects.first()
+        expected = set(Post.objects.filter(
+            author__following__user=follow.user).values_list(
+            "pk", flat=True))
+        self.assertEqual(set(TimelineEntry.objects.filter(
+            user=follow.user).values_list("post_id", flat=True)), expected)
+
+    def test_same_seed_gives_same_posts(self):
+        Seeder(seed=3, prefix="a").run(
+            users=5, groups=1, posts=20, comments=0, follows=0)
+        Seeder(seed=3, prefix="b").run(
+            users=5, groups=1, posts=20, comments=0, follows=0)
+        first, second = (
+            [(post.author.username[2:], post.pub_date.date())
+             for post in Post.objects.filter(
+                 author__username__startswith=prefix).order_by("pk")]
+            for prefix in ("a_", "b_"))
+        self.assertEqual(first, second)
+
+    def test_seed_command(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        with override_settings(MEDIA_ROOT=media):
+            call_command("seed", users=50, groups=2, posts=400, comments=10,
+                         follows=200, image_share=0.5, stdout=StringIO())
+        self.assertEqual(Post.objects.count(), 400)
+        with_image = Post.objects.exclude(image="")
+        self.assertTrue(0 < with_image.count() < 400)
+        self.assertFalse(with_image.filter(thumbnail="").exists())
+        # Перекос: у самого активного автора заметно больше средних 8 постов.
+        self.assertGreater(
+            UserStats.objects.order_by("-posts_count")[0].posts_count, 40)
+        with self.assertRaises(CommandError):
+            call_command("seed", users=1, stdout=StringIO())
+
+
+class RequestBudgetTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        user = User.objects.create_user(username="writer")
+        Post.objects.create(text="text", author=user)
+        cache.clear()
+
+    @override_settings(REQUEST_BUDGETS={"index": {"queries": 0}},
+                       REQUEST_BUDGETS_STRICT=True)
+    def test_strict_mode_lists_queries(self):
+        with self.assertRaisesRegex(BudgetExceeded, "queries .* > 0") as error:
+            self.client.get(reverse("index"))
+        self.assertIn("SELECT", str(error.exception))
+
+    @override_settings(REQUEST_BUDGETS={"index": {"queries": 0}},
+                       REQUEST_BUDGETS_STRICT=False)
+    def test_production_mode_logs_warning(self):
+        with self.assertLogs("posts.budgets", "WARNING") as logs:
+            response = self.client.get(reverse("index"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(logs.records[0].url_name, "index")
+        self.assertEqual(logs.records[0].exceeded, ["queries"])
+
+    @override_settings(REQUEST_BUDGETS={"index": {"render_ms": -1}},
+                       REQUEST_BUDGETS_STRICT=True)
+    def test_strict_mode_only_warns_about_time(self):
+        with self.assertLogs("posts.budgets", "WARNING") as logs:
+            response = self.client.get(reverse("index"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(logs.records[0].exceeded, ["render_ms"])
+
+    def test_render_timing_is_removed_after_the_request(self):
+        self.client.get(reverse("index"))
+        self.assertIs(Template.render, budgets._original_render)
+
+
+class QueryPlanTest(TestCase):
+    def setUp(self):
+        reader = User.objects.create_user(username="reader")
+        author = User.objects.create_user(username="author")
+        group = Group.objects.create(title="group", slug="group")
+        Follow.objects.create(user=reader, author=author)
+        Post.objects.create(text="text", author=author, group=group)
+
+    def test_feeds_use_indexes(self):
+        out = StringIO()
+        call_command("check_query_plans", stdout=out)
+        self.assertIn("используют индексы", out.getvalue())
+
+    def test_follow_is_unique(self):
+        follow = Follow.objects.first()
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Follow.objects.create(user=follow.user, author=follow.author)
+        self.client.force_login(follow.user)
+        self.client.get(reverse("profile_follow", args=[follow.author]))
+        self.assertEqual(Follow.objects.count(), 1)
+
+
+class TransferTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        Seeder(seed=2, batch_size=7).run(
+            users=6, groups=2, posts=30, comments=20, follows=15)
+
+    def snapshot(self):
+        return {
+            "posts": list(Post.objects.order_by("text").values_list(
+                "author__username", "group__slug", "text", "pub_date")),
+            "comments": list(Comment.objects.order_by("text").values_list(
+                "post__text", "author__username", "text", "created")),
+            "follows": list(Follow.objects.order_by(
+                "user__username", "author__username").values_list(
+                "user__username", "author__username")),
+            "stats": list(UserStats.objects.order_by(
+                "user__username").values_list(
+                "user__username", "posts_count", "followers_count")),
+        }
+
+    def export_and_clear(self):
+        call_command("export_yatube", self.directory, chunk_size=4,
+                     stdout=StringIO())
+        expected = self.snapshot()
+        for model in (Post, Group, User):
+            model.objects.all().delete()
+        return expected
+
+    def test_round_trip_remaps_keys(self):
+        expected = self.export_and_clear()
+        User.objects.create_user(username="existing")
+        call_command("import_yatube", self.directory, batch_size=4,
+                     stdout=StringIO())
+        self.assertEqual(self.snapshot()["posts"], expected["posts"])
+        self.assertEqual(self.snapshot()["comments"], expected["comments"])
+        self.assertEqual(self.snapshot()["follows"], expected["follows"])
+        # Повторный запуск ничего не добавляет: прогресс сохранён.
+        call_command("import_yatube", self.directory, stdout=StringIO())
+        self.assertEqual(Post.objects.count(), 30)
+
+    def test_resume_after_crash_between_commits(self):
+        expected = self.export_and_clear()
+
+        class CrashingImporter(transfer.Importer):
+            crashed = False
+
+            def finish_ranged(self, name, *args):
+                if name == "posts" and not self.crashed:
+                    CrashingImporter.crashed = True
+                    raise KeyboardInterrupt
+                return super().finish_ranged(name, *args)
+
+        importer = CrashingImporter(self.directory, batch_size=4)
+        with self.assertRaises(KeyboardInterrupt):
+            importer.run()
+        importer.close()
+        self.assertEqual(Post.objects.count(), 4)
+        call_command("import_yatube", self.directory, batch_size=4,
+                     stdout=StringIO())
+        self.assertEqual(self.snapshot(), expected)
+
+
+class CommentPaginationTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.author = User.objects.create_user(username="author")
+        self.post = Post.objects.create(text="text", author=self.author)
+        self.url = reverse("post", args=[self.author.username, self.post.pk])
+        cache.clear()
+
+    def add_comments(self, count):
+        for number in range(count):
+            reader = User.objects.create_user(username=f"reader{number}")
+            Comment.objects.create(post=self.post, author=reader,
+                                   text=f"comment {number}")
+
+    def test_newest_comments_then_show_more(self):
+        self.add_comments(25)
+        response = self.client.get(self.url)
+        texts = [item.text for item in response.context["items"]]
+        self.assertEqual(texts, [f"comment {n}" for n in range(24, 4, -1)])
+        more_url = (reverse("post_comments",
+                            args=[self.author.username, self.post.pk])
+                    + f"?after={response.context['items'].next_cursor}")
+        self.assertContains(response, more_url.replace("&", "&amp;"))
+
+        more = self.client.get(more_url)
+        self.assertEqual([item.text for item in more.context["items"]],
+                         [f"comment {n}" for n in range(4, -1, -1)])
+        self.assertNotContains(more, "Показать ещё")
+
+    def test_comments_are_the_page_itself(self):
+        self.add_comments(25)
+        response = self.client.get(self.url)
+        comments = response.context["comments"]
+        self.assertIs(comments, response.context["items"].object_list)
+        with self.assertNumQueries(0):
+            self.assertEqual(len(list(comments)), 20)
+
+    def test_query_count_does_not_grow_with_comments(self):
+        self.add_comments(1)
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(self.url)
+        for number in range(1, 15):
+            reader = User.objects.create_user(username=f"extra{number}")
+            Comment.objects.create(post=self.post, author=reader, text="x")
+        cache.clear()
+        with CaptureQueriesContext(connection) as many:
+            self.client.get(self.url)
+        self.assertEqual(len(few), len(many))
+
+
+class ApiTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.author = User.objects.create_user(username="author")
+        self.group = Group.objects.create(title="group", slug="group")
+        self.posts = [
+            Post.objects.create(text=f"post {number}", author=self.author,
+                                group=self.group)
+            for number in range(5)
+        ]
+
+    def get_json(self, url, **extra):
+        response = self.client.get(url, **extra)
+        return response, json.loads(b"".join(response.streaming_content))
+
+    def test_cursor_pagination(self):
+        url = reverse("api:group_posts", args=[self.group.slug])
+        response, first = self.get_json(url + "?limit=3")
+        self.assertEqual(response["Content-Type"], "application/json")
+        self.assertEqual([row["text"] for row in first["results"]],
+                         ["post 4", "post 3", "post 2"])
+        self.assertEqual(first["results"][0]["author"]["username"],
+                         "author")
+        self.assertEqual(first["results"][0]["group"]["slug"], "group")
+        _, second = self.get_json(f"{url}?limit=3&after={first['next']}")
+        self.assertEqual([row["text"] for row in second["results"]],
+                         ["post 1", "post 0"])
+        self.assertIsNone(second["next"])
+
+    def test_anonymous_revalidation(self):
+        url = reverse("api:posts")
+        response, _ = self.get_json(url)
+        self.assertIn("public", response["Cache-Control"])
+        with CaptureQueriesContext(connection) as queries:
+            not_modified = self.client.get(
+                url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(len(queries), 0)
+
+        Post.objects.create(text="fresh", author=self.author)
+        response, data = self.get_json(url,
+                                       HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data["results"][0]["text"], "fresh")
+
+    def test_post_detail_and_comments(self):
+        post = self.posts[0]
+        Comment.objects.create(post=post, author=self.author, text="hi")
+        data = self.client.get(reverse("api:post", args=[post.pk])).json()
+        self.assertEqual(data["comment_count"], 1)
+        _, comments = self.get_json(
+            reverse("api:post_comments", args=[post.pk]))
+        self.assertEqual(comments["results"][0]["text"], "hi")
+        self.assertEqual(
+            self.client.get(reverse("api:post", args=[0])).status_code, 404)
+        self.assertEqual(self.client.get(
+            reverse("api:post_comments", args=[0])).status_code, 404)
+
+
+class SyndicationFeedTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.author = User.objects.create_user(username="author")
+        self.group = Group.objects.create(title="group", slug="group")
+        self.post = Post.objects.create(text="feed text", author=self.author,
+                                        group=self.group)
+
+    def test_feeds_list_posts(self):
+        for name, args in (("site_rss", []), ("group_rss", ["group"]),
+                           ("author_rss", ["author"])):
+            response = self.client.get(reverse(name, args=args))
+            self.assertEqual(response["Content-Type"],
+                             "application/rss+xml; charset=utf-8")
+            self.assertContains(response, "feed text")
+        response = self.client.get(reverse("group_atom", args=["group"]))
+        self.assertIn("application/atom+xml", response["Content-Type"])
+        self.assertContains(response, reverse(
+            "post", args=[self.author.username, self.post.pk]))
+        self.assertEqual(self.client.get(
+            reverse("group_rss", args=["missing"])).status_code, 404)
+
+    def test_feeds_of_an_author_named_feeds(self):
+        author = User.objects.create_user(username="feeds")
+        Post.objects.create(text="by feeds", author=author)
+        response = self.client.get(reverse("author_rss", args=["feeds"]))
+        self.assertContains(response, "by feeds")
+        self.assertNotContains(response, "feed text")
+
+    def test_signup_rejects_site_paths_as_usernames(self):
+        for username in ("trending", "RSS", "search"):
+            form = CreationForm({
+                "username": username, "email": "user@example.com",
+                "password1": "Gq7!vR2#pLm", "password2": "Gq7!vR2#pLm",
+            })
+            self.assertIn("username", form.errors)
+        self.assertNotIn("feeds", reserved_usernames())
+
+    def test_revalidation_and_invalidation(self):
+        url = reverse("author_atom", args=["author"])
+        response = self.client.get(url)
+        etag = response["ETag"]
+        self.assertIn("Last-Modified", response)
+        with CaptureQueriesContext(connection) as queries:
+            not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(len(queries), 1)
+
+        Post.objects.filter(pk=self.post.pk).update(text="silent edit")
+        self.assertContains(self.client.get(url), "feed text")
+        Post.objects.create(text="fresh", author=self.author)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "fresh")
+
+
+class SuggestionTest(TestCase):
+    def setUp(self):
+        self.users = {
+            name: User.objects.create_user(username=name)
+            for name in ("me", "friend", "other", "popular", "niche")
+        }
+        for user, author in (("me", "friend"), ("me", "other"),
+                             ("friend", "popular"), ("other", "popular"),
+                             ("friend", "niche"), ("popular", "me")):
+            self.follow(user, author)
+
+    def follow(self, user, author):
+        Follow.objects.create(user=self.users[user],
+                              author=self.users[author])
+
+    def names(self, user):
+        return [(suggestion.candidate.username, suggestion.score)
+                for suggestion in suggestions.for_user(self.users[user])]
+
+    def test_graph_ranks_two_hop_authors(self):
+        graph = suggestions.FollowGraph.load()
+        me = self.users["me"].pk
+        self.assertEqual(sorted(graph.following(me)),
+                         [self.users["friend"].pk, self.users["other"].pk])
+        self.assertEqual(graph.suggest(me), [
+            (self.users["popular"].pk, 2), (self.users["niche"].pk, 1)])
+        self.assertEqual(graph.suggest(10 ** 6), [])
+
+    def test_full_and_incremental_refresh(self):
+        call_command("build_suggestions", "--full", stdout=StringIO())
+        self.assertEqual(self.names("me"), [("popular", 2), ("niche", 1)])
+        self.assertFalse(SuggestionRefresh.objects.exists())
+
+        self.follow("me", "niche")
+        self.assertEqual(self.names("me"), [("popular", 2)])
+        self.follow("other", "niche")
+        self.assertEqual(suggestions.refresh(), (3, 5))
+        self.assertEqual(self.names("me"), [("popular", 2)])
+        self.assertEqual(self.names("popular"),
+                         [("friend", 1), ("other", 1), ("niche", 1)])
+
+    def test_follow_page_shows_suggestions(self):
+        suggestions.refresh(full=True)
+        client = Client()
+        client.force_login(self.users["me"])
+        response = client.get(reverse("follow_index"))
+        self.assertEqual([s.candidate.username
+                          for s in response.context["suggestions"]],
+                         ["popular", "niche"])
+        self.assertContains(response, reverse("profile_follow",
+                                              args=["popular"]))
+
+
+class TrendingTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username="author")
+        self.group = Group.objects.create(title="group", slug="group")
+        self.quiet = Post.objects.create(text="quiet", author=self.author)
+        self.hot = Post.objects.create(text="hot", author=self.author,
+                                       group=self.group)
+
+    def comment(self, post, count):
+        for _ in range(count):
+            Comment.objects.create(post=post, author=self.author, text="c")
+
+    def scores(self):
+        return dict(PostTrend.objects.values_list("post_id", "score"))
+
+    def test_comments_update_scores_incrementally(self):
+        self.comment(self.quiet, 1)
+        self.comment(self.hot, 2)
+        self.assertEqual(trending.top_post_ids(),
+                         [self.hot.pk, self.quiet.pk])
+        self.assertEqual(trending.top_groups(),
+                         [{"slug": "group", "title": "group"}])
+        self.assertAlmostEqual(GroupTrend.objects.get().score, 3, places=3)
+
+        response = Client().get(reverse("trending"))
+        self.assertEqual([post.text for post in response.context["posts"]],
+                         ["hot", "quiet"])
+        self.assertContains(response, reverse("group", args=["group"]))
+
+    def test_feed_pages_show_trending_groups(self):
+        self.comment(self.hot, 1)
+        client = Client()
+        client.force_login(self.author)
+        urls = [reverse("index"), reverse("group", args=["group"]),
+                reverse("profile", args=["author"]), reverse("follow_index")]
+        for url in urls:
+            with self.subTest(url=url):
+                response = client.get(url)
+                self.assertContains(response, "Популярные сообщества")
+                self.assertContains(response, reverse("group", args=["group"]))
+
+    def test_deleted_comments_lose_their_weight(self):
+        self.comment(self.hot, 2)
+        self.hot.comments.first().delete()
+        self.assertAlmostEqual(self.scores()[self.hot.pk], 1, places=3)
+        # Пост в группе и оставшийся комментарий.
+        self.assertAlmostEqual(GroupTrend.objects.get().score, 2, places=3)
+
+    def test_comments_do_not_lock_the_state_row(self):
+        with mock.patch.object(trending, "_locked_state",
+                               side_effect=AssertionError):
+            self.comment(self.hot, 1)
+        self.assertAlmostEqual(self.scores()[self.hot.pk], 1, places=3)
+
+    def test_old_events_weigh_less(self):
+        now = timezone.now()
+        half_life = timedelta(seconds=settings.TRENDING_HALF_LIFE)
+        for _ in range(3):
+            trending.record(self.quiet.pk, None, 1, now - 2 * half_life)
+        trending.record(self.hot.pk, None, 1, now)
+        scores = self.scores()
+        self.assertGreater(scores[self.hot.pk], scores[self.quiet.pk])
+
+    def test_compact_keeps_order_and_prunes(self):
+        self.comment(self.quiet, 1)
+        self.comment(self.hot, 2)
+        before = self.scores()
+        half_life = timedelta(seconds=settings.TRENDING_HALF_LIFE)
+        later = TrendingState.objects.get().epoch + 3 * half_life
+        self.assertEqual(trending.compact(later), 0)
+        after = self.scores()
+        self.assertAlmostEqual(after[self.hot.pk], before[self.hot.pk] / 8)
+        self.assertEqual(trending.compact(later + 10 * half_life), 3)
+        self.assertFalse(PostTrend.objects.exists())
+
+    def test_rebuild_matches_incremental_scores(self):
+        self.comment(self.quiet, 1)
+        self.comment(self.hot, 2)
+        now = timezone.now()
+        trending.compact(now)
+        incremental = self.scores()
+        trending.rebuild(now)
+        for pk, score in self.scores().items():
+            self.assertAlmostEqual(score, incremental[pk])
+        self.assertAlmostEqual(GroupTrend.objects.get().score, 3, places=3)
+
+
+class PostCardCacheTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username="author")
+        self.reader = User.objects.create_user(username="reader")
+        self.post = Post.objects.create(text="card text", author=self.author)
+        self.edit_url = reverse("post_edit",
+                                args=[self.author.username, self.post.pk])
+
+    def cards(self, user=None):
+        return cards.render_cards(
+            feed_queryset(Post.objects.filter(pk=self.post.pk)), user)
+
+    def test_cards_are_shared_until_the_post_changes(self):
+        self.assertIn("card text", self.cards()[0])
+        Post.objects.filter(pk=self.post.pk).update(text="silent edit")
+        self.assertIn("card text", self.cards()[0])
+
+        Comment.objects.create(post=self.post, author=self.reader, text="hi")
+        card = self.cards()[0]
+        self.assertIn("silent edit", card)
+        self.assertIn("1 комментариев", card)
+
+    def test_author_and_group_changes_refresh_cards(self):
+        group = Group.objects.create(title="old title", slug="cards")
+        Post.objects.filter(pk=self.post.pk).update(group=group)
+        self.assertIn("old title", self.cards()[0])
+        group.title = "new title"
+        group.save()
+        self.assertIn("new title", self.cards()[0])
+        self.author.username = "renamed"
+        self.author.save()
+        self.assertIn("@renamed", self.cards()[0])
+
+    def test_edit_link_is_added_per_viewer(self):
+        self.assertNotIn(self.edit_url, self.cards(self.reader)[0])
+        self.assertIn(self.edit_url, self.cards(self.author)[0])
+        self.assertNotIn(self.edit_url, self.cards()[0])
+        key, = cards.card_keys([self.post])
+        self.assertNotIn(self.edit_url, cache.get(key))
+
+    def test_pages_use_cached_cards(self):
+        client = Client()
+        client.force_login(self.author)
+        response = client.get(reverse("profile", args=["author"]))
+        self.assertContains(response, self.edit_url)
+        self.assertIsNotNone(cache.get(cards.card_keys([self.post])[0]))
+        response = Client().get(reverse("index"))
+        self.assertContains(response, "card text")
+        self.assertNotContains(response, self.edit_url)
+
+
+@override_settings(DATABASE_REPLICAS=["replica"])
+class ReplicaRoutingTest(TransactionTestCase):
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.user = User.objects.create_user(username="reader")
+        self.author = User.objects.create_user(username="author")
+        self.post = Post.objects.create(text="text", author=self.author)
+        self.client.force_login(self.user)
+
+    def queries(self, url):
+        with CaptureQueriesContext(connections["default"]) as primary, \
+                CaptureQueriesContext(connections["replica"]) as replica:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(primary), len(replica)
+
+    def test_read_only_views_use_the_replica(self):
+        self.queries(reverse("profile", args=["author"]))
+        primary, replica = self.queries(reverse("profile", args=["author"]))
+        # Сессия и пользователь берутся из кэша, с default ничего не читается.
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+        self.assertEqual(self.queries(reverse("new_post"))[1], 0)
+
+    def test_writes_pin_the_user_to_the_primary(self):
+        response = self.client.get(reverse("profile_follow",
+                                           args=["author"]))
+        self.assertIn(routing.PIN_COOKIE, response.cookies)
+        self.assertEqual(self.queries(reverse("follow_index"))[1], 0)
+
+        del self.client.cookies[routing.PIN_COOKIE]
+        self.assertGreater(self.queries(reverse("follow_index"))[1], 0)
+
+    def test_shared_caches_are_filled_from_the_primary(self):
+        self.client.logout()
+        self.assertEqual(self.queries(reverse("index"))[1], 0)
+
+    def test_feed_fragments_are_not_stored_from_the_replica(self):
+        url = reverse("profile", args=["author"])
+        response = self.client.get(url)
+        key = make_template_fragment_key("feed_posts",
+                                         [response.context["cache_key"]])
+        self.assertIsNone(cache.get(key))
+
+        self.client.cookies[routing.PIN_COOKIE] = "1"
+        response = self.client.get(url)
+        self.assertIn("text", cache.get(key))
+
+
+@override_settings(WRITE_QUEUE=True)
+class WriteQueueTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username="author")
+        self.post = Post.objects.create(text="text", author=self.author)
+
+    def comment(self, text):
+        return Comment(post=self.post, author=self.author, text=text).save
+
+    def test_batch_isolates_failing_operations(self):
+        def fail():
+            raise ValueError("boom")
+
+        batch = [(func, (), {}, Future())
+                 for func in (self.comment("one"), fail, self.comment("two"))]
+        self.assertTrue(writes.run_batch(batch))
+        self.assertIsNone(batch[0][3].result())
+        with self.assertRaises(ValueError):
+            batch[1][3].result()
+        self.assertEqual(
+            sorted(self.post.comments.values_list("text", flat=True)),
+            ["one", "two"])
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 2)
+
+    def test_views_wait_for_the_writer(self):
+        client = Client()
+        client.force_login(self.author)
+        client.post(reverse("add_comment", args=["author", self.post.pk]),
+                    {"text": "queued"})
+        self.assertTrue(self.post.comments.filter(text="queued").exists())
+        with self.assertRaises(ValueError):
+            writes.submit(int, "not a number")
+
+    def test_waiters_are_released_when_the_writer_dies(self):
+        queue = writes.WriteQueue()
+        with self.assertRaises(RuntimeError):
+            queue.submit(sys.exit)
+        self.assertEqual(queue.submit(int, "7"), 7)
+
+    @override_settings(WRITE_QUEUE_TIMEOUT=0.05)
+    def test_waiting_for_the_writer_times_out(self):
+        queue = writes.WriteQueue()
+        with self.assertRaises(TimeoutError):
+            queue.submit(time.sleep, 0.5)
+
+
+@override_settings(RATE_LIMITS={"add_comment": (2, 60), "limited": (1, 10)})
+class RateLimitTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="user")
+        self.post = Post.objects.create(text="text", author=self.user)
+        self.client.force_login(self.user)
+        self.url = reverse("add_comment", args=["user", self.post.pk])
+        # Часы остановлены в начале окна: иначе тест, попавший на стык
+        # окон, начал бы счёт заново.
+        clock = mock.patch.object(ratelimit, "now_ms", return_value=0)
+        clock.start()
+        self.addCleanup(clock.stop)
+
+    def comment(self, client=None):
+        return (client or self.client).post(self.url, {"text": "comment"})
+
+    def test_over_limit_requests_get_429(self):
+        with mock.patch.object(ratelimit, "now_ms", return_value=1000000):
+            self.comment()
+            self.comment()
+            response = self.comment()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "20")
+        self.assertEqual(self.post.comments.count(), 2)
+
+    def test_limit_resets_in_the_next_window(self):
+        with mock.patch.object(ratelimit, "now_ms", return_value=1000000):
+            self.comment()
+            self.comment()
+        with mock.patch.object(ratelimit, "now_ms", return_value=1019999):
+            self.assertEqual(self.comment().status_code, 429)
+        with mock.patch.object(ratelimit, "now_ms", return_value=1020000):
+            self.assertEqual(self.comment().status_code, 302)
+            self.assertEqual(self.comment().status_code, 302)
+            self.assertEqual(self.comment().status_code, 429)
+
+    def test_buckets_are_per_user(self):
+        self.comment()
+        self.comment()
+        other = Client()
+        other.force_login(User.objects.create_user(username="other"))
+        self.assertEqual(self.comment(other).status_code, 302)
+
+    @override_settings(RATE_LIMITS={"new_post": (1, 60)})
+    def test_forms_can_be_opened_freely(self):
+        for _ in range(3):
+            self.assertEqual(
+                self.client.get(reverse("new_post")).status_code, 200)
+        self.client.post(reverse("new_post"), {"text": "first"})
+        response = self.client.post(reverse("new_post"), {"text": "second"})
+        self.assertEqual(response.status_code, 429)
+
+    @override_settings(RATE_LIMITS={"profile_follow": (1, 60)})
+    def test_follow_links_are_limited(self):
+        User.objects.create_user(username="author")
+        url = reverse("profile_follow", args=["author"])
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.assertEqual(self.client.get(url).status_code, 429)
+
+    @override_settings(RATE_LIMITS={"add_comment": (0, 60)})
+    def test_empty_limit_is_rejected(self):
+        with self.assertRaises(ImproperlyConfigured):
+            self.comment()
+
+    def test_decorator_limits_anonymous_users_by_ip(self):
+        view = ratelimit.rate_limited("limited")(
+            lambda request: HttpResponse("ok"))
+        factory = RequestFactory()
+
+        def call(address):
+            request = factory.post("/", REMOTE_ADDR=address)
+            request.user = AnonymousUser()
+            return view(request).status_code
+
+        self.assertEqual(call("10.0.0.1"), 200)
+        self.assertEqual(call("10.0.0.1"), 429)
+        self.assertEqual(call("10.0.0.2"), 200)
+
+    def test_first_request_in_a_window_costs_one_cache_call(self):
+        key = f"ratelimit:add_comment:user:{self.user.pk}"
+        with mock.patch.object(cache, "add", wraps=cache.add) as add, \
+                mock.patch.object(cache, "incr", wraps=cache.incr) as incr:
+            self.assertEqual(ratelimit.take(key, 2, 60), 0)
+        add.assert_called_once()
+        incr.assert_not_called()
+
+
+class UserCacheTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        auth._users.clear()
+        self.user = User.objects.create_user(username="user")
+        self.backend = auth.CachedModelBackend()
+
+    def test_user_is_served_from_the_process_cache(self):
+        self.backend.get_user(self.user.pk)
+        with self.assertNumQueries(0):
+            user = self.backend.get_user(self.user.pk)
+        self.assertEqual(user, self.user)
+        self.assertIsNot(user, self.backend.get_user(self.user.pk))
+
+    def test_shared_cache_fills_other_processes(self):
+        self.backend.get_user(self.user.pk)
+        auth._users.clear()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.backend.get_user(self.user.pk), self.user)
+
+    def test_saving_the_user_invalidates_copies(self):
+        self.backend.get_user(self.user.pk)
+        self.user.first_name = "Новое имя"
+        self.user.save()
+        self.assertEqual(self.backend.get_user(self.user.pk).first_name,
+                         "Новое имя")
+        self.user.delete()
+        self.assertIsNone(self.backend.get_user(self.user.pk))
+
+    def test_sessions_from_model_backend_stay_logged_in(self):
+        self.client.force_login(
+            self.user, backend="django.contrib.auth.backends.ModelBackend")
+        response = self.client.get(reverse("new_post"))
+        self.assertEqual(response.status_code, 200)
+
+    def test_wrong_password_is_checked_once(self):
+        self.user.set_password("secret")
+        self.user.save()
+        with mock.patch.object(User, "check_password",
+                               return_value=False) as check_password:
+            self.assertFalse(self.client.login(username="user",
+                                               password="wrong"))
+        check_password.assert_called_once()
+        self.assertTrue(self.client.login(username="user",
+                                          password="secret"))
+
+    def test_shared_copies_expire(self):
+        with mock.patch.object(cache, "set", wraps=cache.set) as cache_set:
+            self.backend.get_user(self.user.pk)
+        self.assertEqual(cache_set.call_args[0][2],
+                         settings.USER_CACHE_TIMEOUT)
+
+    def test_logged_in_request_reads_neither_session_nor_user(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse("new_post"))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("new_post"))
+        self.assertEqual(response.context["user"], self.user)
+        tables = " ".join(query["sql"] for query in queries)
+        self.assertNotIn("django_session", tables)
+        self.assertNotIn('FROM "auth_user"', tables)
@@ -0,0 +1,55 @@
+import logging
+
+from sorl.thumbnail import get_thumbnail
+
+from posts.cache_keys import bump_post
+from posts.models import Post
+from posts.tasks import enqueue
+
+logger = logging.getLogger(__name__)
+
+# Вариант картинки для карточки поста, см. posts/includes/post_item.html
+GEOMETRY = "960x339"
+OPTIONS = {"crop": "center", "upscale": True}
+
+
+def generate(image_name):
+    """Строит миниатюру карточки; ошибки только логируются."""
+    try:
+        return get_thumbnail(image_name, GEOMETRY, **OPTIONS)
+    except Exception:
+        logger.exception("Не удалось построить миниатюру %s", image_name)
+        return None
+
+
+def generate_for_post(post_id):
+    """Строит миниатюру и сохраняет её путь и размеры в строке поста,
+    чтобы лента не обращалась к хранилищу ключей sorl."""
+    post = Post.objects.filter(pk=post_id).values(
+        "image", "author_id", "group_id").first()
+    if not post or not post["image"]:
+        return False
+    thumbnail = generate(post["image"])
+    if thumbnail is None:
+        return False
+    updated = Post.objects.filter(pk=post_id, image=post["image"]).update(
+        thumbnail=thumbnail.name,
+        thumbnail_width=thumbnail.width,
+        thumbnail_height=thumbnail.height,
+    )
+    if updated:
+        # Закэшированные страницы показывают оригинал — сбрасываем их.
+        bump_post(post_id, post["author_id"], post["group_id"])
+    return bool(updated)
+
+
+def reset(post):
+    """Забывает миниатюру поста, у которого сменилась картинка."""
+    post.thumbnail = ""
+    post.thumbnail_width = post.thumbnail_height = None
+
+
+def schedule(post):
+    """Ставит построение миниатюры поста в фоновую очередь."""
+    if post.image:
+        enqueue(generate_for_post, post.pk)
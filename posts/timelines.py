@@ -0,0 +1,162 @@
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+
+from posts import cache_keys
+from posts.models import Follow, Post, TimelineEntry, User, UserStats
+from posts.paginators import CursorPaginator, MergedCursorPaginator
+from posts.queries import chunked_ids
+
+BATCH_SIZE = 500
+
+
+def _is_pull_author(author_id):
+    # Авторам с огромным числом подписчиков ленты не раскладываем:
+    # их посты подмешиваются в ленту при чтении.
+    return UserStats.objects.filter(
+        user_id=author_id,
+        followers_count__gt=settings.TIMELINE_FANOUT_LIMIT,
+    ).exists()
+
+
+def _pull_author_ids(user):
+    followed = Follow.objects.filter(user=user).values("author_id")
+    return list(UserStats.objects.filter(
+        user_id__in=followed,
+        followers_count__gt=settings.TIMELINE_FANOUT_LIMIT,
+    ).values_list("user_id", flat=True))
+
+
+def _bulk_insert(entries):
+    TimelineEntry.objects.bulk_create(
+        entries, batch_size=BATCH_SIZE, ignore_conflicts=True)
+
+
+def fan_out_post(post_id):
+    """Раскладывает новый пост в ленты всех подписчиков автора."""
+    post = Post.objects.filter(pk=post_id).values(
+        "author_id", "pub_date").first()
+    if post is None or post["author_id"] is None:
+        return
+    if _is_pull_author(post["author_id"]):
+        return
+    followers = Follow.objects.filter(
+        author_id=post["author_id"]).values_list("user_id", flat=True)
+    batch = []
+    for user_id in followers.iterator():
+        batch.append(TimelineEntry(user_id=user_id, post_id=post_id,
+                                   pub_date=post["pub_date"]))
+        if len(batch) >= BATCH_SIZE:
+            _bulk_insert(batch)
+            batch = []
+    _bulk_insert(batch)
+    # Сигнал сдвинул поколения при коммите поста, раньше этой записи:
+    # лента, собранная в промежутке, не должна остаться в кэше.
+    cache_keys.bump(("timelines",))
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту подписчика уже опубликованные посты автора."""
+    if _is_pull_author(author_id):
+        return
+    posts = Post.objects.filter(author_id=author_id).values_list(
+        "id", "pub_date")
+    batch = []
+    for post_id, pub_date in posts.iterator():
+        batch.append(TimelineEntry(user_id=user_id, post_id=post_id,
+                                   pub_date=pub_date))
+        if len(batch) >= BATCH_SIZE:
+            _bulk_insert(batch)
+            batch = []
+    _bulk_insert(batch)
+    cache_keys.bump(("follows", user_id))
+
+
+def fan_in_author(author_id):
+    """Автор стал читаться при чтении ленты: убирает его разложенные
+    посты из лент подписчиков."""
+    if not _is_pull_author(author_id):
+        return
+    TimelineEntry.objects.filter(post__author_id=author_id).delete()
+    cache_keys.bump(("timelines",))
+
+
+def fan_out_author(author_id):
+    """Автор снова раскладывается по лентам: добавляет подписчикам все
+    его посты, в том числе опубликованные, пока он читался при чтении."""
+    if _is_pull_author(author_id):
+        return
+    sql = f"""
+        INSERT INTO {TimelineEntry._meta.db_table} (user_id, post_id, pub_date)
+        SELECT follow.user_id, post.id, post.pub_date
+        FROM {Follow._meta.db_table} AS follow
+        JOIN {Post._meta.db_table} AS post
+            ON post.author_id = follow.author_id
+        WHERE follow.author_id = %s
+        ON CONFLICT DO NOTHING
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(sql, [author_id])
+    cache_keys.bump(("timelines",))
+
+
+def prune(user_id, author_id):
+    """Убирает из ленты посты автора, от которого пользователь отписался."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id).delete()
+    cache_keys.bump(("follows", user_id))
+
+
+# Поля для CursorPaginator: разложенная лента листается по индексу
+# записей ленты (user, pub_date, post), посты авторов, которые читаются
+# при чтении, — по индексу (author, pub_date); без временной сортировки.
+ORDERING = ("feed_date", "feed_pk")
+
+
+def timeline_sources(user):
+    """Списки постов, из которых складывается лента подписок: записи
+    ленты пользователя и посты каждого автора, читаемого при чтении.
+
+    Ключ сортировки аннотирован как feed_date/feed_pk (см. ORDERING).
+    """
+    pushed = Post.objects.filter(timeline_entries__user=user).annotate(
+        feed_date=F("timeline_entries__pub_date"),
+        feed_pk=F("timeline_entries__post_id"))
+    pulled = [
+        Post.objects.filter(author_id=author_id).annotate(
+            feed_date=F("pub_date"), feed_pk=F("pk"))
+        for author_id in _pull_author_ids(user)
+    ]
+    return [pushed, *pulled]
+
+
+def paginator(user, per_page, wrap=None):
+    """Пагинатор ленты подписок; wrap дополняет каждый список постов,
+    например feed_queryset. Посты авторов, читаемых при чтении, каждый
+    раз читаются по странице от курсора и сливаются с записями ленты."""
+    sources = [wrap(queryset) if wrap else queryset
+               for queryset in timeline_sources(user)]
+    if len(sources) == 1:
+        return CursorPaginator(sources[0], per_page, ordering=ORDERING)
+    return MergedCursorPaginator(sources, per_page, ordering=ORDERING)
+
+
+def rebuild(chunk_size=1000):
+    """Пересобирает ленты всех пользователей, например после массовой
+    загрузки данных через bulk_create, которая не вызывает сигналы."""
+    TimelineEntry.objects.all().delete()
+    sql = f"""
+        INSERT INTO {TimelineEntry._meta.db_table} (user_id, post_id, pub_date)
+        SELECT DISTINCT follow.user_id, post.id, post.pub_date
+        FROM {Follow._meta.db_table} AS follow
+        JOIN {Post._meta.db_table} AS post
+            ON post.author_id = follow.author_id
+        LEFT JOIN {UserStats._meta.db_table} AS stats
+            ON stats.user_id = follow.author_id
+        WHERE follow.user_id BETWEEN %s AND %s
+            AND COALESCE(stats.followers_count, 0) <= %s
+    """
+    for chunk in chunked_ids(User.objects.all(), chunk_size):
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(sql, [chunk[0], chunk[-1],
+                                 settings.TIMELINE_FANOUT_LIMIT])
@@ -0,0 +1,308 @@
+"""Перенос данных между окружениями: каждая модель — файл JSONL.
+
+Экспорт читает базу порциями через .iterator(), импорт пишет порциями
+через bulk_create, поэтому память не зависит от объёма данных.
+Соответствие старых и новых id и прогресс импорта хранятся в файле
+SQLite рядом с выгрузкой: прерванный импорт продолжается с того же
+места. Импортировать нужно в базу, куда в это время никто не пишет:
+новые id постов и комментариев определяются по диапазону после
+последнего существующего id.
+"""
+import json
+import os
+import sqlite3
+from itertools import islice
+
+from django.db import transaction
+
+from posts import cache_keys, counters, search, timelines, trending
+from posts.models import Comment, Follow, Group, Post, User
+from posts.seeding import manual_dates
+
+STATE_FILE = "import-state.sqlite3"
+
+MODELS = {
+    "users": (User, ("pk", "username", "password", "first_name",
+                     "last_name", "email", "is_active", "is_staff",
+                     "is_superuser", "date_joined", "last_login")),
+    "groups": (Group, ("pk", "title", "slug", "description")),
+    "posts": (Post, ("pk", "text", "pub_date", "author_id", "group_id",
+                     "image", "thumbnail", "thumbnail_width",
+                     "thumbnail_height")),
+    "comments": (Comment, ("pk", "post_id", "author_id", "text",
+                           "created")),
+    "follows": (Follow, ("user_id", "author_id")),
+}
+
+STATE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS progress (
+    model TEXT PRIMARY KEY,
+    lines INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pending (
+    model TEXT PRIMARY KEY,
+    end_line INTEGER NOT NULL,
+    last_pk INTEGER NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pk_map (
+    model TEXT NOT NULL,
+    old INTEGER NOT NULL,
+    new INTEGER NOT NULL,
+    PRIMARY KEY (model, old)
+) WITHOUT ROWID;
+"""
+
+# Ограничение на число параметров в одном запросе к файлу состояния.
+LOOKUP_CHUNK = 500
+
+
+class ImportConflict(Exception):
+    pass
+
+
+def _path(directory, name):
+    return os.path.join(directory, f"{name}.jsonl")
+
+
+def _encode(value):
+    # DjangoJSONEncoder обрезает микросекунды, а по ним сортируются ленты.
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} не сериализуется в JSON")
+
+
+def export(directory, chunk_size=2000):
+    """Выгружает модели в directory, возвращает число строк по моделям."""
+    os.makedirs(directory, exist_ok=True)
+    counts = {}
+    for name, (model, fields) in MODELS.items():
+        path = _path(directory, name)
+        rows = model.objects.order_by("pk").values(*fields).iterator(
+            chunk_size=chunk_size)
+        count = 0
+        with open(path + ".tmp", "w", encoding="utf-8") as output:
+            for row in rows:
+                output.write(json.dumps(row, default=_encode,
+                                        ensure_ascii=False))
+                output.write("\n")
+                count += 1
+        os.replace(path + ".tmp", path)
+        counts[name] = count
+    return counts
+
+
+def _build(model, row, **overrides):
+    """Объект модели из строки выгрузки: даты и числа приводятся полями."""
+    values = {**row, **overrides}
+    values.pop("pk", None)
+    return model(**{
+        name: model._meta.get_field(name).to_python(value)
+        for name, value in values.items()
+    })
+
+
+class Importer:
+    def __init__(self, directory, batch_size=1000, restart=False, log=None):
+        self.directory = directory
+        self.batch_size = batch_size
+        self.log = log or (lambda message: None)
+        state_path = os.path.join(directory, STATE_FILE)
+        if restart and os.path.exists(state_path):
+            os.remove(state_path)
+        self.state = sqlite3.connect(state_path)
+        self.state.executescript(STATE_SCHEMA)
+
+    def close(self):
+        self.state.close()
+
+    def progress(self, name):
+        row = self.state.execute(
+            "SELECT lines FROM progress WHERE model = ?", (name,)).fetchone()
+        return row[0] if row else 0
+
+    def read(self, name, start):
+        with open(_path(self.directory, name), encoding="utf-8") as source:
+            for line in islice(source, start, None):
+                yield json.loads(line)
+
+    def batches(self, name):
+        start = self.progress(name)
+        rows = self.read(name, start)
+        while True:
+            batch = list(islice(rows, self.batch_size))
+            if not batch:
+                return
+            start += len(batch)
+            yield batch, start
+
+    def lookup(self, name, old_ids):
+        """Новые id для старых: {старый: новый}."""
+        old_ids = list({pk for pk in old_ids if pk is not None})
+        found = {}
+        for offset in range(0, len(old_ids), LOOKUP_CHUNK):
+            chunk = old_ids[offset:offset + LOOKUP_CHUNK]
+            found.update(self.state.execute(
+                "SELECT old, new FROM pk_map WHERE model = ? AND old IN "
+                f"({','.join('?' * len(chunk))})", [name, *chunk]))
+        return found
+
+    def remember(self, name, end_line, pairs=()):
+        """Фиксирует порцию: соответствие id и число прочитанных строк."""
+        with self.state:
+            self.state.executemany(
+                "INSERT OR REPLACE INTO pk_map VALUES (?, ?, ?)",
+                ((name, old, new) for old, new in pairs))
+            self.state.execute("INSERT OR REPLACE INTO progress VALUES (?, ?)",
+                               (name, end_line))
+            self.state.execute("DELETE FROM pending WHERE model = ?", (name,))
+
+    def insert_ranged(self, name, rows, objects, end_line):
+        """Вставляет объекты без естественного ключа.
+
+        Новые id — первые len(rows) id после последнего существующего.
+        До вставки это место записывается в pending, чтобы после сбоя
+        между коммитами понять, дошла ли порция до базы.
+        """
+        model = MODELS[name][0]
+        last_pk = model.objects.order_by("-pk").values_list(
+            "pk", flat=True).first() or 0
+        with self.state:
+            self.state.execute(
+                "INSERT OR REPLACE INTO pending VALUES (?, ?, ?, ?)",
+                (name, end_line, last_pk, len(objects)))
+        with transaction.atomic():
+            model.objects.bulk_create(objects)
+        self.finish_ranged(name, rows, end_line, last_pk, len(objects))
+
+    def finish_ranged(self, name, rows, end_line, last_pk, size):
+        model = MODELS[name][0]
+        new_ids = list(model.objects.filter(pk__gt=last_pk).order_by(
+            "pk").values_list("pk", flat=True)[:size])
+        if len(new_ids) != size:
+            raise ImportConflict(
+                f"{name}: ожидалось {size} новых строк, найдено "
+                f"{len(new_ids)}; в базу писали во время импорта?")
+        pairs = zip((row["pk"] for row in rows), new_ids) if (
+            name == "posts") else ()
+        self.remember(name, end_line, pairs)
+
+    def recover(self, name, prepare):
+        """Завершает порцию, прерванную между коммитом базы и состояния."""
+        pending = self.state.execute(
+            "SELECT end_line, last_pk, size FROM pending WHERE model = ?",
+            (name,)).fetchone()
+        if pending is None:
+            return
+        end_line, last_pk, size = pending
+        model = MODELS[name][0]
+        if model.objects.filter(pk__gt=last_pk).count() >= size:
+            start = self.progress(name)
+            rows, _ = prepare(list(islice(self.read(name, start),
+                                          end_line - start)))
+            self.finish_ranged(name, rows, end_line, last_pk, size)
+        else:
+            with self.state:
+                self.state.execute("DELETE FROM pending WHERE model = ?",
+                                   (name,))
+
+    def import_users(self):
+        # Пользователи и группы сопоставляются по естественному ключу:
+        # существующие не создаются заново, повтор порции безопасен.
+        for rows, end_line in self.batches("users"):
+            usernames = [row["username"] for row in rows]
+            existing = set(User.objects.filter(
+                username__in=usernames).values_list("username", flat=True))
+            with transaction.atomic():
+                User.objects.bulk_create(
+                    _build(User, row) for row in rows
+                    if row["username"] not in existing)
+            new_ids = dict(User.objects.filter(
+                username__in=usernames).values_list("username", "pk"))
+            self.remember("users", end_line, (
+                (row["pk"], new_ids[row["username"]]) for row in rows))
+
+    def import_groups(self):
+        for rows, end_line in self.batches("groups"):
+            slugs = [row["slug"] for row in rows]
+            existing = set(Group.objects.filter(
+                slug__in=slugs).values_list("slug", flat=True))
+            with transaction.atomic():
+                Group.objects.bulk_create(
+                    _build(Group, row) for row in rows
+                    if row["slug"] not in existing)
+            new_ids = dict(Group.objects.filter(
+                slug__in=slugs).values_list("slug", "pk"))
+            self.remember("groups", end_line, (
+                (row["pk"], new_ids[row["slug"]]) for row in rows))
+
+    def prepare_posts(self, rows):
+        users = self.lookup("users", (row["author_id"] for row in rows))
+        groups = self.lookup("groups", (row["group_id"] for row in rows))
+        return rows, [
+            _build(Post, row, author_id=users.get(row["author_id"]),
+                   group_id=groups.get(row["group_id"]))
+            for row in rows
+        ]
+
+    def prepare_comments(self, rows):
+        posts = self.lookup("posts", (row["post_id"] for row in rows))
+        users = self.lookup("users", (row["author_id"] for row in rows))
+        rows = [row for row in rows if row["post_id"] in posts]
+        return rows, [
+            _build(Comment, row, post_id=posts[row["post_id"]],
+                   author_id=users.get(row["author_id"]))
+            for row in rows
+        ]
+
+    def import_ranged(self, name, prepare):
+        self.recover(name, prepare)
+        for rows, end_line in self.batches(name):
+            rows, objects = prepare(rows)
+            if objects:
+                self.insert_ranged(name, rows, objects, end_line)
+            else:
+                self.remember(name, end_line)
+
+    def import_follows(self):
+        for rows, end_line in self.batches("follows"):
+            users = self.lookup("users", (
+                pk for row in rows for pk in (row["user_id"],
+                                              row["author_id"])))
+            follows = [
+                Follow(user_id=users[row["user_id"]],
+                       author_id=users[row["author_id"]])
+                for row in rows
+                if row["user_id"] in users and row["author_id"] in users
+            ]
+            with transaction.atomic():
+                Follow.objects.bulk_create(follows, ignore_conflicts=True)
+            self.remember("follows", end_line)
+
+    def finish(self):
+        """Пересчитывает то, что при bulk_create ведут сигналы."""
+        counters.repair_all(chunk_size=self.batch_size)
+        timelines.rebuild(chunk_size=self.batch_size)
+        if search.is_supported():
+            search.rebuild(batch_size=self.batch_size)
+        trending.rebuild(batch_size=self.batch_size)
+        # Загрузка меняет ленты, профили, посты и подписки сразу у многих
+        # авторов: проще сбросить все кэши, чем перечислять их.
+        cache_keys.bump_site()
+
+    def run(self):
+        with manual_dates():
+            self.import_all()
+        self.finish()
+
+    def import_all(self):
+        self.import_users()
+        self.log(f"users: {self.progress('users')}")
+        self.import_groups()
+        self.log(f"groups: {self.progress('groups')}")
+        self.import_ranged("posts", self.prepare_posts)
+        self.log(f"posts: {self.progress('posts')}")
+        self.import_ranged("comments", self.prepare_comments)
+        self.log(f"comments: {self.progress('comments')}")
+        self.import_follows()
+        self.log(f"follows: {self.progress('follows')}")
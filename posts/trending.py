@@ -0,0 +1,206 @@
+"""Популярные посты и группы по затухающему весу событий.
+
+Событие в момент t весит 2 ** ((t - epoch) / TRENDING_HALF_LIFE): вместо
+того чтобы уменьшать все веса со временем, растут веса новых событий, и
+порядок строк от этого не зависит. Поэтому при каждом комментарии или
+посте меняется одна строка (score = score + вес), а чтение топа — это
+первые K строк индекса по score.
+
+Команда compact_trending переносит точку отсчёта на текущий момент:
+делит веса, чтобы числа не росли без предела, и удаляет остывшие строки.
+
+Запись читает точку отсчёта без блокировки, строку TrendingState
+блокирует только сжатие. Событие, записанное одновременно со сжатием,
+может получить вес по старой точке отсчёта — завышенный в 2 ** (часть
+периода полураспада с прошлого сжатия) раз; такой выброс остывает вместе
+с остальными. Удалённый комментарий вычитает свой вес из строк поста и
+группы.
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from posts.models import Comment, GroupTrend, Post, PostTrend, TrendingState
+
+COMMENT_WEIGHT = 1.0
+POST_WEIGHT = 1.0
+TOP = 20
+# Строки легче сотой доли свежего события при сжатии удаляются.
+PRUNE_BELOW = 0.01
+# Столько периодов полураспада проходит, пока свежее событие остынет.
+PRUNE_HALF_LIVES = 7
+# Ближе к пределу float сжатие запускается прямо при записи.
+MAX_HALF_LIVES = 512
+
+POSTS_KEY = "trending:posts"
+GROUPS_KEY = "trending:groups"
+
+# SQLite 3.24+ и PostgreSQL: вес меняется без чтения строки.
+UPSERT_SQL = """
+INSERT INTO {table} ({pk}, score) VALUES (%s, %s)
+ON CONFLICT ({pk}) DO UPDATE SET score = {table}.score + excluded.score
+"""
+STATE_SQL = """
+INSERT INTO {table} (id, epoch) VALUES (%s, %s) ON CONFLICT (id) DO NOTHING
+"""
+# Вычитание не создаёт строк: остывшие уже удалены при сжатии.
+SUBTRACT_SQL = "UPDATE {table} SET score = score + %s WHERE {pk} = %s"
+
+
+def _half_lives(since, until):
+    return (until - since).total_seconds() / settings.TRENDING_HALF_LIFE
+
+
+def _create_state(now):
+    """Создаёт строку TrendingState, если её нет; True — создали мы.
+
+    Строку создаёт миграция; запасной вариант — для пустой базы.
+    """
+    sql = STATE_SQL.format(
+        table=connection.ops.quote_name(TrendingState._meta.db_table))
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [1, now])
+        return cursor.rowcount == 1
+
+
+def _epoch(now):
+    epoch = TrendingState.objects.filter(pk=1).values_list(
+        "epoch", flat=True).first()
+    if epoch is None:
+        if _create_state(now):
+            return now
+        return _epoch(now)
+    return epoch
+
+
+def _locked_state(now):
+    state = TrendingState.objects.select_for_update().filter(pk=1).first()
+    if state is None:
+        _create_state(now)
+        state = TrendingState.objects.select_for_update().get(pk=1)
+    return state
+
+
+def _add(model, pk, amount):
+    """Прибавляет amount к весу строки одним запросом; положительный
+    вес создаёт строку, если её нет."""
+    sql = UPSERT_SQL if amount > 0 else SUBTRACT_SQL
+    sql = sql.format(
+        table=connection.ops.quote_name(model._meta.db_table),
+        pk=connection.ops.quote_name(model._meta.pk.column))
+    params = [pk, amount] if amount > 0 else [amount, pk]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def record(post_id, group_id, weight, when):
+    """Добавляет событие к весам поста и группы (любой из них — None).
+
+    Отрицательный weight отменяет ранее записанное событие.
+    """
+    epoch = _epoch(when)
+    with transaction.atomic():
+        if _half_lives(epoch, when) > MAX_HALF_LIVES:
+            state = _locked_state(when)
+            if _half_lives(state.epoch, when) > MAX_HALF_LIVES:
+                _compact(state, when)
+            epoch = state.epoch
+        amount = weight * 2 ** _half_lives(epoch, when)
+        if post_id is not None:
+            _add(PostTrend, post_id, amount)
+        if group_id is not None:
+            _add(GroupTrend, group_id, amount)
+
+
+def record_post(post):
+    record(None, post.group_id, POST_WEIGHT, post.pub_date)
+
+
+def record_comment(comment, group_id):
+    record(comment.post_id, group_id, COMMENT_WEIGHT, comment.created)
+
+
+def forget_comment(comment, group_id):
+    record(comment.post_id, group_id, -COMMENT_WEIGHT, comment.created)
+
+
+def _compact(state, now):
+    factor = 2 ** -_half_lives(state.epoch, now)
+    pruned = 0
+    for model in (PostTrend, GroupTrend):
+        model.objects.update(score=F("score") * factor)
+        pruned += model.objects.filter(score__lt=PRUNE_BELOW).delete()[0]
+    state.epoch = now
+    state.save(update_fields=["epoch"])
+    return pruned
+
+
+def compact(now=None):
+    """Переносит точку отсчёта на now, возвращает число удалённых строк."""
+    now = now or timezone.now()
+    with transaction.atomic():
+        return _compact(_locked_state(now), now)
+
+
+def rebuild(now=None, batch_size=2000):
+    """Считает веса заново по событиям, которые ещё не остыли.
+
+    Нужна после загрузки данных через bulk_create, минуя сигналы.
+    """
+    now = now or timezone.now()
+    since = now - timedelta(
+        seconds=settings.TRENDING_HALF_LIFE * PRUNE_HALF_LIVES)
+    posts, groups = Counter(), Counter()
+    new_posts = Post.objects.filter(
+        pub_date__gte=since, group_id__isnull=False).values_list(
+        "group_id", "pub_date")
+    for group_id, pub_date in new_posts.iterator(chunk_size=batch_size):
+        groups[group_id] += POST_WEIGHT * 2 ** -_half_lives(pub_date, now)
+    comments = Comment.objects.filter(created__gte=since).values_list(
+        "post_id", "post__group_id", "created")
+    for post_id, group_id, created in comments.iterator(
+            chunk_size=batch_size):
+        amount = COMMENT_WEIGHT * 2 ** -_half_lives(created, now)
+        posts[post_id] += amount
+        if group_id is not None:
+            groups[group_id] += amount
+    with transaction.atomic():
+        state = _locked_state(now)
+        PostTrend.objects.all().delete()
+        GroupTrend.objects.all().delete()
+        PostTrend.objects.bulk_create(
+            (PostTrend(post_id=pk, score=score)
+             for pk, score in posts.items()))
+        GroupTrend.objects.bulk_create(
+            (GroupTrend(group_id=pk, score=score)
+             for pk, score in groups.items()))
+        state.epoch = now
+        state.save(update_fields=["epoch"])
+    cache.delete_many([POSTS_KEY, GROUPS_KEY])
+
+
+def ranked_post_ids(limit=TOP):
+    return list(PostTrend.objects.order_by("-score").values_list(
+        "post_id", flat=True)[:limit])
+
+
+def ranked_groups(limit=TOP):
+    return list(GroupTrend.objects.order_by("-score").values(
+        slug=F("group__slug"), title=F("group__title"))[:limit])
+
+
+def top_post_ids():
+    """id популярных постов; список живёт в кэше TRENDING_CACHE_TIMEOUT."""
+    return cache.get_or_set(POSTS_KEY, ranked_post_ids,
+                            settings.TRENDING_CACHE_TIMEOUT)
+
+
+def top_groups():
+    """Популярные группы: [{"slug": ..., "title": ...}]."""
+    return cache.get_or_set(GROUPS_KEY, ranked_groups,
+                            settings.TRENDING_CACHE_TIMEOUT)
@@ -1,6 +1,6 @@
 from django.urls import path
 
-from posts import views
+from posts import feeds, views
 
 urlpatterns = [
     path("", views.index, name="index"),
@@ -11,8 +11,16 @@ urlpatterns = [
     path("<str:username>/unfollow/", views.profile_unfollow,
          name="profile_unfollow"
          ),
+    path("rss/", feeds.site_rss, name="site_rss"),
+    path("atom/", feeds.site_atom, name="site_atom"),
     path("group/<slug:slug>/", views.group_posts, name="group"),
+    path("group/<slug:slug>/rss/", feeds.group_rss, name="group_rss"),
+    path("group/<slug:slug>/atom/", feeds.group_atom, name="group_atom"),
     path("new/", views.new_post, name="new_post"),
+    path("search/", views.search_posts, name="search"),
+    path("trending/", views.trending_posts, name="trending"),
+    path("<str:username>/rss/", feeds.author_rss, name="author_rss"),
+    path("<str:username>/atom/", feeds.author_atom, name="author_atom"),
     path('<str:username>/', views.profile, name='profile'),
     path('<str:username>/<int:post_id>/', views.post_view, name='post'),
     path('<str:username>/<int:post_id>/edit/', views.post_edit,
@@ -21,4 +29,6 @@ urlpatterns = [
     path("<username>/<int:post_id>/comment", views.add_comment,
          name="add_comment"
          ),
+    path("<username>/<int:post_id>/comments/", views.post_comments,
+         name="post_comments"),
 ]
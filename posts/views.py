@@ -2,27 +2,56 @@ from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
 from django.shortcuts import get_object_or_404, redirect, render
 
+from posts import search, suggestions, thumbnails, timelines, trending, writes
+from posts.cache_keys import feed_cache_key
 from posts.forms import CommentForm, PostForm
 from posts.models import Follow, Group, Post, User
+from posts.page_cache import (anonymous_page_cache, group_scope, index_scope,
+                              post_scope, profile_scope)
+from posts.paginators import CursorPaginator, loaded_queryset, page_context
+from posts.queries import feed_queryset
 
+COMMENTS_PER_PAGE = 20
 
+
+@anonymous_page_cache(index_scope)
 def index(request):
-    post_list = Post.objects.all()
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
-    return render(
-        request, "index.html", {"page": page, "paginator": paginator})
+    post_list = feed_queryset()
+    paginator = CursorPaginator(post_list, 10)
+    page = paginator.get_page(request.GET)
+    cache_key = feed_cache_key("index", request, ("posts",))
+    return render(request, "index.html",
+                  {**page_context(page), "cache_key": cache_key})
 
 
+@anonymous_page_cache(group_scope)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.all()
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    post_list = feed_queryset(group.posts.all())
+    paginator = CursorPaginator(post_list, 10)
+    page = paginator.get_page(request.GET)
+    cache_key = feed_cache_key("group", request, ("group", group.pk))
     return render(request, "group.html",
-                  {"page": page, "paginator": paginator, "group": group})
+                  {**page_context(page), "group": group,
+                   "cache_key": cache_key})
+
+
+def search_posts(request):
+    query = request.GET.get("q", "").strip()
+    paginator = Paginator(search.ranked_post_ids(query) if query else [], 10)
+    page = paginator.get_page(request.GET.get("page"))
+    posts = feed_queryset().in_bulk(page.object_list)
+    page.object_list = [posts[pk] for pk in page.object_list if pk in posts]
+    return render(request, "posts/search.html",
+                  {"page": page, "paginator": paginator, "query": query})
+
+
+def trending_posts(request):
+    post_ids = trending.top_post_ids()
+    posts = feed_queryset().in_bulk(post_ids)
+    return render(request, "posts/trending.html", {
+        "posts": [posts[pk] for pk in post_ids if pk in posts],
+    })
 
 
 @login_required
@@ -34,42 +63,73 @@ def new_post(request):
         return render(request, "posts/new.html", {"form": form})
     post_form_get = form.save(commit=False)
     post_form_get.author = request.user
-    post_form_get.save()
+    writes.submit(post_form_get.save)
+    thumbnails.schedule(post_form_get)
     return redirect("index")
 
 
+@anonymous_page_cache(profile_scope)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    author_posts = author.posts.all()
+    author = get_object_or_404(User.objects.select_related("stats"),
+                               username=username)
+    author_posts = feed_queryset(author.posts.all())
     following = Follow.objects.filter(user__username=request.user,
                                       author__username=username).exists()
-    paginator = Paginator(author_posts, 6)
-    page_number = request.GET.get("page")
-    page = paginator.get_page(page_number)
+    paginator = CursorPaginator(author_posts, 6)
+    page = paginator.get_page(request.GET)
+    cache_key = feed_cache_key("profile", request, ("author", author.pk))
     return render(request, "posts/profile.html",
                   {
-                      "page": page,
-                      "paginator": paginator,
+                      **page_context(page),
                       "author": author,
-                      "following": following
+                      "following": following,
+                      "cache_key": cache_key,
 
                   })
 
 
+def comments_page(post, params):
+    """Самые новые комментарии поста вместе с авторами."""
+    comments = post.comments.select_related("author")
+    paginator = CursorPaginator(comments, COMMENTS_PER_PAGE,
+                                ordering=("created", "pk"))
+    page = paginator.get_page(params)
+    page.object_list = loaded_queryset(paginator.object_list,
+                                       page.object_list)
+    return page
+
+
+def comments_context(post, params):
+    """comments — комментарии страницы, items — навигация по ним."""
+    page = comments_page(post, params)
+    return {"post": post, "comments": page.object_list, "items": page}
+
+
+@anonymous_page_cache(post_scope)
 def post_view(request, username, post_id):
-    post = get_object_or_404(Post, author__username=username, id=post_id)
-    comments = post.comments.all()
+    post = get_object_or_404(
+        feed_queryset().select_related("author__stats"),
+        author__username=username, id=post_id)
     return render(request, "posts/post.html", {
-        "post": post,
+        **comments_context(post, {}),
         "author": post.author,
-        "items": comments,
         "form": CommentForm(),
     })
 
 
+@anonymous_page_cache(post_scope)
+def post_comments(request, username, post_id):
+    """Следующая порция комментариев для кнопки «Показать ещё»."""
+    post = get_object_or_404(Post.objects.select_related("author"),
+                             author__username=username, id=post_id)
+    return render(request, "posts/includes/comment_list.html",
+                  comments_context(post, request.GET))
+
+
 @login_required
 def post_edit(request, username, post_id):
-    post = get_object_or_404(Post, id=post_id)
+    post = get_object_or_404(Post.objects.select_related("author"),
+                             id=post_id)
     if post.author != request.user:
         return redirect("post", username=username, post_id=post.id)
 
@@ -81,7 +141,12 @@ def post_edit(request, username, post_id):
 
     if request.method == "POST":
         if form.is_valid():
-            post.save()
+            image_changed = "image" in form.changed_data
+            if image_changed:
+                thumbnails.reset(post)
+            writes.submit(post.save)
+            if image_changed:
+                thumbnails.schedule(post)
             return redirect("post", username=post.author,
                             post_id=post.id
                             )
@@ -98,7 +163,7 @@ def add_comment(request, username, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        writes.submit(comment.save)
     return redirect('post', username=username, post_id=post_id)
 
 
@@ -119,14 +184,13 @@ def server_error(request):
 
 @login_required
 def follow_index(request):
-    user = request.user
-    if user.following.count == 0:
-        return render(request, "posts/follow.html")
-    post_list = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(post_list, 6)
-    page_number = request.GET.get("page")
-    page = paginator.get_page(page_number)
-    context = {"page": page, "paginator": paginator}
+    paginator = timelines.paginator(request.user, 6, wrap=feed_queryset)
+    page = paginator.get_page(request.GET)
+    # ("timelines",) сдвигают фоновые задачи, когда допишут ленты.
+    cache_key = feed_cache_key("follow_index", request, ("posts",),
+                               ("timelines",), ("follows", request.user.pk))
+    context = {**page_context(page), "cache_key": cache_key,
+               "suggestions": suggestions.for_user(request.user)}
     return render(request, "posts/follow.html", context)
 
 
@@ -134,12 +198,14 @@ def follow_index(request):
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     if request.user != author:
-        Follow.objects.get_or_create(user=request.user, author=author)
+        writes.submit(Follow.objects.get_or_create, user=request.user,
+                      author=author)
     return redirect("profile", username=username)
 
 
 @login_required
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
-    Follow.objects.filter(user=request.user, author=author).delete()
+    writes.submit(
+        Follow.objects.filter(user=request.user, author=author).delete)
     return redirect("profile", username=username)
@@ -0,0 +1,126 @@
+"""Запись в SQLite без борьбы за блокировку.
+
+SQLite пускает одного писателя на файл: если несколько потоков
+одновременно держат открытые транзакции записи, остальные ждут и в
+итоге получают «database is locked». При WRITE_QUEUE все мелкие записи
+процесса (комментарии, подписки, новые посты) выполняет один поток:
+он забирает из очереди до WRITE_QUEUE_BATCH_SIZE операций и проводит
+их одной транзакцией, каждую в своей точке сохранения. Вызывающий ждёт
+коммита и получает результат или исключение своей операции.
+
+SQLITE_WAL включает журнал WAL: читатели не блокируют писателя и не
+ждут его, а synchronous=NORMAL убирает fsync на каждый коммит.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError
+
+from django.conf import settings
+from django.db import connection, transaction
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    """Обработчик connection_created: настройка новых соединений SQLite."""
+    if connection.vendor != "sqlite" or not settings.SQLITE_WAL:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+
+
+class WriteQueue:
+    def __init__(self):
+        self.pending = queue.Queue()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def submit(self, func, *args, **kwargs):
+        future = Future()
+        self.pending.put((func, args, kwargs, future))
+        self.start()
+        try:
+            return future.result(timeout=settings.WRITE_QUEUE_TIMEOUT)
+        except TimeoutError:
+            # Ещё не начатая операция снимается с очереди; начатая может
+            # завершиться и после того, как вызывающий получил ошибку.
+            future.cancel()
+            raise
+
+    def start(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(
+                    target=self.work, name="posts-writer", daemon=True)
+                self.thread.start()
+
+    def take_batch(self):
+        batch = [self.pending.get()]
+        linger_until = time.monotonic() + settings.WRITE_QUEUE_LINGER
+        while len(batch) < settings.WRITE_QUEUE_BATCH_SIZE:
+            try:
+                batch.append(self.pending.get(
+                    timeout=max(linger_until - time.monotonic(), 0)))
+            except queue.Empty:
+                break
+        return batch
+
+    def work(self):
+        # Соединение писателя живёт вместе с потоком: переоткрывать его на
+        # каждую пачку дороже самой записи.
+        while True:
+            batch = self.take_batch()
+            try:
+                committed = run_batch(batch)
+            finally:
+                # BaseException посреди пачки завершает поток: ждущие её
+                # не должны висеть до тайм-аута.
+                for *_, future in batch:
+                    if not future.done():
+                        future.set_exception(
+                            RuntimeError("Поток записи остановился"))
+            if not committed:
+                connection.close()
+
+
+def run_batch(batch):
+    """Выполняет операции одной транзакцией и сообщает результаты
+    после коммита, когда отработали и хуки on_commit.
+
+    Возвращает False, если не удался сам коммит."""
+    outcomes = []
+    try:
+        with transaction.atomic():
+            for func, args, kwargs, future in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    with transaction.atomic():
+                        outcomes.append((future, func(*args, **kwargs), None))
+                except Exception as error:
+                    outcomes.append((future, None, error))
+    except Exception as error:
+        for *_, future in batch:
+            if not future.done():
+                future.set_exception(error)
+        return False
+    for future, result, error in outcomes:
+        if error is None:
+            future.set_result(result)
+        else:
+            future.set_exception(error)
+    return True
+
+
+_queue = WriteQueue()
+
+
+def submit(func, *args, **kwargs):
+    """Выполняет запись func(*args, **kwargs) и возвращает её результат.
+
+    Без WRITE_QUEUE или внутри уже открытой транзакции — сразу в текущем
+    потоке, иначе через общий поток-писатель.
+    """
+    if not settings.WRITE_QUEUE or connection.in_atomic_block:
+        return func(*args, **kwargs)
+    return _queue.submit(func, *args, **kwargs)
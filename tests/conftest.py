@@ -1,4 +1,28 @@
+import pytest
+
 pytest_plugins = [
     'tests.fixtures.fixture_user',
     'tests.fixtures.fixture_data',
+    'posts.pytest_plugin',
 ]
+
+
+@pytest.fixture(autouse=True, scope='session')
+def isolated_cache():
+    # Свой временный файл кэша вместо общего, как в yatube.test_runner.
+    from yatube.test_runner import isolated_caches
+    with isolated_caches():
+        yield
+
+
+@pytest.fixture(autouse=True)
+def clear_cache(isolated_cache):
+    # Кэш хранится в файле и переживает пересоздание тестовой базы.
+    from django.core.cache import cache
+    cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def eager_tasks(settings):
+    # Фоновые задачи выполняются сразу, как в yatube.test_runner.
+    settings.POSTS_TASKS_EAGER = True
@@ -1,10 +1,35 @@
+from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth import get_user_model
+from django.urls import get_resolver
 
 User = get_user_model()
 
 
+def reserved_usernames(patterns=None):
+    """Первые сегменты адресов сайта: профиль /<username>/ с таким
+    именем перекрывали бы trending/, rss/ и другие страницы."""
+    if patterns is None:
+        patterns = get_resolver().url_patterns
+    names = set()
+    for pattern in patterns:
+        segment = str(pattern.pattern).split("/")[0]
+        if not segment:
+            # include() без префикса — страницы posts в корне сайта.
+            names |= reserved_usernames(
+                getattr(pattern, "url_patterns", []))
+        elif "<" not in segment:
+            names.add(segment.lstrip("^"))
+    return names
+
+
 class CreationForm(UserCreationForm):
     class Meta(UserCreationForm.Meta):
         model = User
         fields = ("first_name", "last_name", "username", "email")
+
+    def clean_username(self):
+        username = self.cleaned_data["username"]
+        if username.lower() in reserved_usernames():
+            raise forms.ValidationError("Это имя занято адресом сайта")
+        return username
@@ -20,7 +20,7 @@ INTERNAL_IPS = [
 
 INSTALLED_APPS = [
     'users',
-    'posts',
+    'posts.apps.PostsConfig',
     'ckeditor',
     'django.contrib.sites',
     'django.contrib.flatpages',
@@ -36,10 +36,13 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'posts.budgets.RequestBudgetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'posts.ratelimit.RateLimitMiddleware',
+    'posts.routing.ReplicaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'debug_toolbar.middleware.DebugToolbarMiddleware',
@@ -71,8 +74,57 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
+    },
+    # Локальная копия для чтения, её обновляет команда sync_replica.
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'replica.sqlite3'),
+        'TEST': {'MIRROR': 'default'},
+    },
 }
+DATABASE_ROUTERS = ['posts.routing.ReplicaRouter']
+
+# Псевдонимы реплик, с которых читают страницы (см. posts/routing.py),
+# например YATUBE_REPLICAS=replica. После записи пользователь столько
+# секунд читает только с default, чтобы видеть свои изменения.
+DATABASE_REPLICAS = [
+    alias for alias in os.environ.get('YATUBE_REPLICAS', '').split(',')
+    if alias
+]
+REPLICA_PIN_SECONDS = 10
+
+# Конкурентная запись в SQLite (posts/writes.py): журнал WAL и один
+# поток-писатель на процесс, объединяющий мелкие записи в транзакции
+# по WRITE_QUEUE_BATCH_SIZE. WRITE_QUEUE_LINGER — сколько секунд писатель
+# ждёт, пока пачка наберётся, WRITE_QUEUE_TIMEOUT — сколько секунд запрос
+# ждёт свою запись. Включаются YATUBE_SQLITE_WAL=1 и YATUBE_WRITE_QUEUE=1.
+SQLITE_WAL = os.environ.get('YATUBE_SQLITE_WAL') == '1'
+WRITE_QUEUE = os.environ.get('YATUBE_WRITE_QUEUE') == '1'
+WRITE_QUEUE_BATCH_SIZE = 32
+WRITE_QUEUE_LINGER = 0
+WRITE_QUEUE_TIMEOUT = 30
+
+# Ограничение частоты запросов (posts/ratelimit.py): имя URL -> (запросов,
+# секунд). Отдельно для каждого пользователя, для анонимов — для IP.
+RATE_LIMITS = {
+    'add_comment': (20, 60),
+    'new_post': (5, 60),
+    'post_edit': (20, 60),
+    'profile_follow': (30, 60),
+    'profile_unfollow': (30, 60),
+}
+
+# Сессии и request.user читаются из общего кэша (posts/auth.py); в LRU
+# процесса держится до USER_CACHE_SIZE пользователей, в общем кэше —
+# USER_CACHE_TIMEOUT секунд. ModelBackend остаётся для сессий, созданных
+# до CachedModelBackend; пароль при входе проверяет только первый.
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+AUTHENTICATION_BACKENDS = [
+    'posts.auth.CachedModelBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+USER_CACHE_SIZE = 1000
+USER_CACHE_TIMEOUT = 60 * 60
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -114,8 +166,100 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, "yatube/../sent_emails")
 
 SITE_ID = 1
 
+# Общий для всех процессов кэш в файле SQLite, см. yatube/sqlite_cache.py.
+# Тесты работают со своим временным файлом (yatube/test_runner.py).
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'yatube.sqlite_cache.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+            'MAX_BYTES': 256 * 1024 * 1024,
+        },
     }
 }
+
+# Фоновые задачи приложения posts (раскладка лент и т.п.) выполняются
+# в пуле потоков после коммита транзакции. POSTS_TASKS_EAGER выполняет их
+# сразу в запросе: его включают тесты (yatube.test_runner и фикстура
+# pytest) и бенчмарки, для отладки — YATUBE_TASKS_EAGER=1.
+POSTS_TASKS_EAGER = os.environ.get('YATUBE_TASKS_EAGER') == '1'
+TEST_RUNNER = 'yatube.test_runner.EagerTasksRunner'
+POSTS_TASK_WORKERS = 4
+
+# Авторам, у которых подписчиков больше этого порога, ленты не
+# раскладываются при публикации: их посты подмешиваются при чтении.
+TIMELINE_FANOUT_LIMIT = 1000
+
+# Время жизни закэшированных страниц для анонимных читателей, секунды.
+# Устаревшие страницы не отдаются: ключ меняется вместе с данными.
+PAGE_CACHE_TIMEOUT = 600
+
+# Сколько секунд клиенты и прокси могут не перепроверять анонимные
+# ответы JSON API (posts/api.py).
+API_CACHE_MAX_AGE = 30
+
+# Популярное (posts/trending.py): за сколько секунд вес события
+# уменьшается вдвое и сколько секунд кэшируется список лучших.
+TRENDING_HALF_LIFE = 12 * 60 * 60
+TRENDING_CACHE_TIMEOUT = 60
+
+# Поиск по постам (SQLite FTS5): сколько самых свежих совпадений
+# ранжировать и насколько день возраста поста ухудшает его bm25.
+SEARCH_MAX_CANDIDATES = 1000
+SEARCH_RECENCY_WEIGHT = 0.01
+
+# Бюджеты на один запрос по имени URL (см. posts/budgets.py): число
+# SQL-запросов, суммарное время в базе и время рендеринга шаблона, мс.
+# Превышение пишется в лог posts.budgets, а в тестах под pytest
+# (REQUEST_BUDGETS_STRICT) превышение числа запросов роняет тест со
+# списком запросов. Число запросов — то, что странице нужно при
+# холодных кэшах: с загрузкой пользователя и без фрагментов в кэше.
+# Фоновые задачи в режиме POSTS_TASKS_EAGER в бюджет не входят; без
+# него каждая задача — одна вставка в очередь PendingTask, она учтена
+# ниже у страниц записи.
+_read_budget = {"db_ms": 100, "render_ms": 200}
+_write_budget = {"db_ms": 200, "render_ms": 200}
+REQUEST_BUDGETS = {
+    # В лентах ещё один запрос — популярные сообщества в боковой колонке.
+    "index": {"queries": 5, **_read_budget},
+    "group": {"queries": 7, **_read_budget},
+    "profile": {"queries": 8, **_read_budget},
+    "post": {"queries": 6, **_read_budget},
+    "post_comments": {"queries": 6, **_read_budget},
+    "follow_index": {"queries": 5, **_read_budget},
+    "search": {"queries": 3, **_read_budget},
+    "trending": {"queries": 4, **_read_budget},
+    "site_rss": {"queries": 3, **_read_budget},
+    "site_atom": {"queries": 3, **_read_budget},
+    "group_rss": {"queries": 5, **_read_budget},
+    "group_atom": {"queries": 5, **_read_budget},
+    "author_rss": {"queries": 5, **_read_budget},
+    "author_atom": {"queries": 5, **_read_budget},
+    # Списки API читаются из базы уже после выхода из middleware,
+    # здесь учитываются только запросы до начала потоковой отдачи.
+    "api:posts": {"queries": 2, **_read_budget},
+    "api:group_posts": {"queries": 2, **_read_budget},
+    "api:user_posts": {"queries": 2, **_read_budget},
+    "api:post_comments": {"queries": 3, **_read_budget},
+    "api:post": {"queries": 3, **_read_budget},
+    "api:user": {"queries": 3, **_read_budget},
+    # Запись: пользователь, проверки формы, сама запись с индексом поиска
+    # и счётчиками (первая строка UserStats автора — ещё 4 запроса:
+    # чтение и вставка в точке сохранения), вес в популярном.
+    "add_comment": {"queries": 8, **_write_budget},
+    # Пользователь, группа из формы (2), два BEGIN, пост и индекс поиска
+    # (2), posts_count (1 + 4), точка отсчёта популярного (1, для базы без
+    # строки TrendingState ещё 1), вес группы и задачи раскладки поста и
+    # миниатюры (2).
+    "new_post": {"queries": 17, **_write_budget},
+    # Пользователь, пост с автором, группа (2), прежняя группа, запись,
+    # индекс поиска и задача миниатюры для новой картинки.
+    "post_edit": {"queries": 8, **_write_budget},
+    # Пользователь, поиск подписки, BEGIN, вставка, два счётчика в точках
+    # сохранения (6, первая строка UserStats — ещё 4), проверка порога
+    # раскладки лент, подсказки (2), задача дополнения ленты.
+    "profile_follow": {"queries": 18, **_write_budget},
+    "profile_unfollow": {"queries": 9, **_write_budget},
+}
+REQUEST_BUDGETS_STRICT = False
@@ -0,0 +1,291 @@
+"""Кэш в файле SQLite (режим WAL), общий для всех процессов на хосте.
+
+Пример настройки:
+
+    CACHES = {
+        "default": {
+            "BACKEND": "yatube.sqlite_cache.SQLiteCache",
+            "LOCATION": "/var/tmp/yatube-cache.sqlite3",
+            "OPTIONS": {"MAX_ENTRIES": 100000, "MAX_BYTES": 256 * 2 ** 20},
+        }
+    }
+
+Когда записей или байт становится больше лимита, вытесняются давно
+не читавшиеся записи (приближённый LRU с точностью до секунды).
+Целые числа хранятся как INTEGER, поэтому incr()/decr() атомарны
+между процессами.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache_entries (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    expires REAL,
+    accessed INTEGER NOT NULL,
+    size INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS cache_entries_accessed
+    ON cache_entries (accessed);
+CREATE TABLE IF NOT EXISTS cache_stats (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    entries INTEGER NOT NULL,
+    bytes INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO cache_stats VALUES (1, 0, 0);
+CREATE TRIGGER IF NOT EXISTS cache_entries_insert
+AFTER INSERT ON cache_entries BEGIN
+    UPDATE cache_stats SET entries = entries + 1, bytes = bytes + NEW.size;
+END;
+CREATE TRIGGER IF NOT EXISTS cache_entries_delete
+AFTER DELETE ON cache_entries BEGIN
+    UPDATE cache_stats SET entries = entries - 1, bytes = bytes - OLD.size;
+END;
+CREATE TRIGGER IF NOT EXISTS cache_entries_update
+AFTER UPDATE OF size ON cache_entries BEGIN
+    UPDATE cache_stats SET bytes = bytes - OLD.size + NEW.size;
+END;
+"""
+
+UPSERT = """
+INSERT INTO cache_entries (key, value, expires, accessed, size)
+VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (key) DO UPDATE SET
+    value = excluded.value,
+    expires = excluded.expires,
+    accessed = excluded.accessed,
+    size = excluded.size
+"""
+
+# Ограничение SQLite на число параметров в одном запросе.
+MAX_VARIABLES = 500
+
+
+def _encode(value):
+    if type(value) is int and -2 ** 63 <= value < 2 ** 63:
+        return value, 8
+    data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+    return data, len(data)
+
+
+def _decode(value):
+    if isinstance(value, int):
+        return value
+    return pickle.loads(value)
+
+
+def _alive(expires, now):
+    return expires is None or expires > now
+
+
+class SQLiteCache(BaseCache):
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get("OPTIONS", {})
+        self._path = location
+        self._max_bytes = options.get("MAX_BYTES")
+        self._busy_timeout = options.get("BUSY_TIMEOUT", 5)
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self._path, timeout=self._busy_timeout,
+                                   isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def _write(self):
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _touch_accessed(self, keys, now):
+        # Отметку чтения обновляем не чаще раза в секунду на ключ,
+        # чтобы горячие чтения не превращались в поток записей.
+        second = int(now)
+        with self._write() as conn:
+            conn.executemany(
+                "UPDATE cache_entries SET accessed = ? "
+                "WHERE key = ? AND accessed < ?",
+                [(second, key, second) for key in keys],
+            )
+
+    def _cull(self, conn, now):
+        entries, size = conn.execute(
+            "SELECT entries, bytes FROM cache_stats").fetchone()
+        if not self._over_limit(entries, size):
+            return
+        conn.execute("DELETE FROM cache_entries WHERE expires <= ?", (now,))
+        entries, size = conn.execute(
+            "SELECT entries, bytes FROM cache_stats").fetchone()
+        while entries and self._over_limit(entries, size):
+            if self._cull_frequency == 0:
+                conn.execute("DELETE FROM cache_entries")
+            else:
+                conn.execute(
+                    "DELETE FROM cache_entries WHERE key IN ("
+                    "SELECT key FROM cache_entries "
+                    "ORDER BY accessed LIMIT ?)",
+                    (max(entries // self._cull_frequency, 1),),
+                )
+            entries, size = conn.execute(
+                "SELECT entries, bytes FROM cache_stats").fetchone()
+
+    def _over_limit(self, entries, size):
+        if entries > self._max_entries:
+            return True
+        return self._max_bytes is not None and size > self._max_bytes
+
+    def get(self, key, default=None, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        row = self._connection().execute(
+            "SELECT value, expires, accessed FROM cache_entries "
+            "WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return default
+        value, expires, accessed = row
+        if not _alive(expires, now):
+            with self._write() as conn:
+                conn.execute("DELETE FROM cache_entries "
+                             "WHERE key = ? AND expires <= ?", (key, now))
+            return default
+        if accessed < int(now):
+            self._touch_accessed([key], now)
+        return _decode(value)
+
+    def get_many(self, keys, version=None):
+        mapping = {self._key(key, version): key for key in keys}
+        now = time.time()
+        found = {}
+        stale = []
+        conn = self._connection()
+        made_keys = list(mapping)
+        for start in range(0, len(made_keys), MAX_VARIABLES):
+            chunk = made_keys[start:start + MAX_VARIABLES]
+            rows = conn.execute(
+                "SELECT key, value, expires, accessed FROM cache_entries "
+                "WHERE key IN (%s)" % ", ".join("?" * len(chunk)), chunk)
+            for key, value, expires, accessed in rows:
+                if not _alive(expires, now):
+                    continue
+                found[mapping[key]] = _decode(value)
+                if accessed < int(now):
+                    stale.append(key)
+        if stale:
+            self._touch_accessed(stale, now)
+        return found
+
+    def has_key(self, key, version=None):
+        key = self._key(key, version)
+        row = self._connection().execute(
+            "SELECT expires FROM cache_entries WHERE key = ?",
+            (key,)).fetchone()
+        return row is not None and _alive(row[0], time.time())
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        now = time.time()
+        expires = self.get_backend_timeout(timeout)
+        rows = []
+        for key, value in data.items():
+            encoded, size = _encode(value)
+            rows.append((self._key(key, version), encoded, expires,
+                         int(now), size))
+        with self._write() as conn:
+            conn.executemany(UPSERT, rows)
+            self._cull(conn, now)
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        encoded, size = _encode(value)
+        with self._write() as conn:
+            conn.execute("DELETE FROM cache_entries "
+                         "WHERE key = ? AND expires <= ?", (key, now))
+            added = conn.execute(
+                "INSERT OR IGNORE INTO cache_entries "
+                "(key, value, expires, accessed, size) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, encoded, self.get_backend_timeout(timeout),
+                 int(now), size),
+            ).rowcount == 1
+            if added:
+                self._cull(conn, now)
+        return added
+
+    def incr(self, key, delta=1, version=None):
+        made_key = self._key(key, version)
+        now = time.time()
+        with self._write() as conn:
+            row = conn.execute(
+                "SELECT value, expires FROM cache_entries WHERE key = ?",
+                (made_key,)).fetchone()
+            if row is None or not _alive(row[1], now):
+                raise ValueError("Key '%s' not found" % key)
+            if isinstance(row[0], int):
+                conn.execute(
+                    "UPDATE cache_entries SET value = value + ? "
+                    "WHERE key = ?", (delta, made_key))
+                return row[0] + delta
+            new_value = _decode(row[0]) + delta
+            encoded, size = _encode(new_value)
+            conn.execute(
+                "UPDATE cache_entries SET value = ?, size = ? WHERE key = ?",
+                (encoded, size, made_key))
+            return new_value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        with self._write() as conn:
+            return conn.execute(
+                "UPDATE cache_entries SET expires = ? "
+                "WHERE key = ? AND (expires IS NULL OR expires > ?)",
+                (self.get_backend_timeout(timeout), key, now),
+            ).rowcount == 1
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version)
+
+    def delete_many(self, keys, version=None):
+        with self._write() as conn:
+            conn.executemany(
+                "DELETE FROM cache_entries WHERE key = ?",
+                [(self._key(key, version),) for key in keys],
+            )
+
+    def clear(self):
+        with self._write() as conn:
+            conn.execute("DELETE FROM cache_entries")
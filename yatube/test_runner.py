@@ -0,0 +1,42 @@
+import os
+import shutil
+import tempfile
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+@contextmanager
+def isolated_caches():
+    """Кэши во временном каталоге вместо общего файла: тесты не стирают
+    кэш работающего сервера (поколения, сессии, лимиты) и не мешают
+    друг другу при параллельном запуске."""
+    directory = tempfile.mkdtemp()
+    caches = {
+        name: {**params,
+               "LOCATION": os.path.join(directory, f"{name}.sqlite3")}
+        for name, params in settings.CACHES.items()
+    }
+    try:
+        with override_settings(CACHES=caches):
+            yield
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+class EagerTasksRunner(DiscoverRunner):
+    """Запуск тестов: фоновые задачи posts выполняются сразу, иначе
+    в TestCase они ждали бы коммита, которого не будет. Кэш — во
+    временном файле, см. isolated_caches."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        settings.POSTS_TASKS_EAGER = True
+        self._cleanup = ExitStack()
+        self._cleanup.enter_context(isolated_caches())
+
+    def teardown_test_environment(self, **kwargs):
+        self._cleanup.close()
+        super().teardown_test_environment(**kwargs)